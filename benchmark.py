@@ -0,0 +1,216 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+import create_workload
+import simulate
+import utils
+from resources import ResourceTable
+
+# No. of cdcs, no. of fdcs, no. of end-users and no. of jobs
+BENCHMARK_SIZES = {'small': (10, 25, 50, 1000),
+                   'medium': (50, 150, 300, 10000),
+                   'large': (200, 1000, 2000, 100000),
+                   'xlarge': (1000, 4000, 5000, 1000000)}
+
+# Arrival process and rate (in jobs/s) of the benchmark workloads
+BENCHMARK_ARRIVALS = ('poisson', 100)
+
+# Folder of the saved baselines, one JSON file per size
+BASELINE_DIR = 'benchmarks'
+
+# Timed runs of each phase, after an untimed warm-up run
+BENCHMARK_REPEATS = 5
+
+# Relative slow-down (or memory growth) of a phase that is reported as a regression
+REGRESSION_TOLERANCE = 0.25
+
+# A phase must also be this much (in s) slower than its baseline to be reported, as short phases are noisy
+MIN_SLOWDOWN_SECONDS = 0.1
+
+# Likewise for the peak memory of a phase (in MB)
+MIN_COMPARED_MEMORY_MB = 1.0
+
+
+def measure_phase(phases, name, prepare, function, repeats=BENCHMARK_REPEATS, jobs=None, trace_memory=True):
+    '''
+    To run one phase of the benchmark, recording its fastest and median wall time, peak memory and throughput
+
+    prepare returns fresh arguments for each run of function. A first run warms up the phase, including
+    the modules it imports lazily, and a second one is traced for peak memory; neither is timed.
+    '''
+    result = function(*prepare())
+    if trace_memory:
+        tracemalloc.start()
+        result = function(*prepare())
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    # For each timed run, on arguments prepared outside of the timer
+    times = []
+    for _ in range(repeats):
+        args = prepare()
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+
+    seconds = min(times)
+    phase = {'seconds': round(seconds, 4), 'median_seconds': round(statistics.median(times), 4), 'repeats': repeats}
+    if trace_memory:
+        phase['peak_memory_mb'] = round(peak_memory_mb, 2)
+    if jobs is not None:
+        phase['jobs_per_second'] = round(jobs / seconds, 1) if seconds else None
+
+    phases[name] = phase
+    return result
+
+
+def run_strategy(strategy, C, F, EU, workload, phases, repeats=BENCHMARK_REPEATS, trace_memory=True):
+    '''
+    To set-up and run one scheduling strategy on clean copies of the topology and workload
+    '''
+    setup, run = simulate.STRATEGIES[strategy]
+
+    def copy_topology():
+        return copy.deepcopy(C), copy.deepcopy(F), copy.deepcopy(EU)
+
+    def set_up_run():
+        architecture = setup(*copy_topology())
+        architecture['SF'] = 0.5
+        architecture['z_score_threshold'] = 0.5
+        return [dict(job) for job in workload], architecture
+
+    measure_phase(phases, f'setup_{strategy}', copy_topology, setup, repeats, trace_memory=trace_memory)
+    return measure_phase(phases, f'run_{strategy}', set_up_run, run, repeats, jobs=len(workload), trace_memory=trace_memory)
+
+
+def run_benchmark(size, seed=0, strategies=('sofnet', 'fdc', 'cdc'), repeats=BENCHMARK_REPEATS, trace_memory=True):
+    '''
+    To benchmark the topology mapping and each scheduling strategy on a seeded network of the given size
+    '''
+    g, h, e, N = BENCHMARK_SIZES[size]
+    arrival_process, rate = BENCHMARK_ARRIVALS
+    phases = {}
+
+    C, F, EU, J = measure_phase(phases, 'generate', lambda: (g, h, e, N, seed, arrival_process, rate), create_workload.set_up_network,
+                                repeats, trace_memory=trace_memory)
+    C, F, EU = simulate.register_resources(C), simulate.register_resources(F), simulate.register_resources(EU)
+    workload = J.sort_values(by=['arrival_time', 'deadline'], kind='stable').to_dict('records')
+
+    # Time the topology mapping on its own, as it grows with the number of nodes rather than jobs
+    C_table, F_table = ResourceTable(C), ResourceTable(F)
+    F_table = measure_phase(phases, 'map_fog_to_cloud', lambda: (F_table, C_table), utils.map_fog_to_cloud, repeats, trace_memory=trace_memory)
+    measure_phase(phases, 'map_end_user_to_fog', lambda: (copy.deepcopy(EU), F_table), utils.map_end_user_to_fog, repeats,
+                  trace_memory=trace_memory)
+
+    performance = {}
+    for strategy in strategies:
+        performance[strategy] = run_strategy(strategy, C, F, EU, workload, phases, repeats, trace_memory)
+
+    return {'size': size,
+            'seed': seed,
+            'repeats': repeats,
+            'network': {'cdcs': g, 'fdcs': h, 'end_users': e, 'jobs': N, 'arrival_process': arrival_process, 'rate': rate},
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'numpy': np.__version__},
+            'phases': phases,
+            'performance': performance}
+
+
+def baseline_path(size, baseline_dir=BASELINE_DIR):
+    return os.path.join(baseline_dir, f'{size}.json')
+
+
+def save_baseline(result, baseline_dir=BASELINE_DIR):
+    os.makedirs(baseline_dir, exist_ok=True)
+    with open(baseline_path(result['size'], baseline_dir), 'w') as file:
+        json.dump(result, file, indent=2)
+
+
+def load_baseline(size, baseline_dir=BASELINE_DIR):
+    path = baseline_path(size, baseline_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def find_regressions(result, baseline, tolerance=REGRESSION_TOLERANCE):
+    '''
+    To list the phases that got slower or used more memory than in the baseline, and the strategies whose results changed
+
+    The fastest of the timed runs of a phase is compared, as noise only ever makes a run slower.
+    '''
+    regressions = []
+    if result['seed'] != baseline['seed'] or result['network'] != baseline['network']:
+        return [f"baseline was measured on another network ({baseline['network']}, seed {baseline['seed']})"]
+
+    # For each phase measured in both runs
+    for name, phase in result['phases'].items():
+        reference = baseline['phases'].get(name)
+        if reference is None:
+            continue
+
+        if phase['seconds'] > max((1 + tolerance) * reference['seconds'], reference['seconds'] + MIN_SLOWDOWN_SECONDS):
+            regressions.append(f"{name}: {phase['seconds']} s (baseline {reference['seconds']} s)")
+
+        if ('peak_memory_mb' in phase and 'peak_memory_mb' in reference and phase['peak_memory_mb'] >= MIN_COMPARED_MEMORY_MB
+                and phase['peak_memory_mb'] > (1 + tolerance) * reference['peak_memory_mb']):
+            regressions.append(f"{name}: {phase['peak_memory_mb']} MB peak (baseline {reference['peak_memory_mb']} MB)")
+
+    # Same seed, same network: a scheduler change must not change the schedule unless intended
+    for strategy, performance_ratio in result['performance'].items():
+        reference = baseline['performance'].get(strategy)
+        if reference is not None and performance_ratio != reference:
+            regressions.append(f'{strategy}: performance changed from {reference} to {performance_ratio}')
+
+    return regressions
+
+
+def display_result(result):
+    print(f"{result['size']}: {result['network']}")
+    for name, phase in result['phases'].items():
+        throughput = f" | {phase['jobs_per_second']} jobs/s" if phase.get('jobs_per_second') else ''
+        memory = f" | {phase['peak_memory_mb']} MB" if 'peak_memory_mb' in phase else ''
+        median = f" (median {phase['median_seconds']} s)" if 'median_seconds' in phase else ''
+        print(f"    {name}: {phase['seconds']} s{median}{throughput}{memory}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the topology mapping and the scheduling strategies')
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(BENCHMARK_SIZES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--strategies', nargs='+', default=['sofnet', 'fdc', 'cdc'], choices=list(simulate.STRATEGIES))
+    parser.add_argument('--baseline-dir', default=BASELINE_DIR)
+    parser.add_argument('--save', action='store_true', help='save the results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument('--repeats', type=int, default=BENCHMARK_REPEATS, help='timed runs of each phase, after a warm-up run')
+    parser.add_argument('--no-memory', action='store_true', help='skip the untimed run of each phase that traces its peak memory')
+    args = parser.parse_args(argv)
+    if args.repeats < 1:
+        parser.error('--repeats must be at least 1')
+
+    has_regressions = False
+    for size in args.sizes:
+        result = run_benchmark(size, args.seed, args.strategies, args.repeats, trace_memory=not args.no_memory)
+        display_result(result)
+
+        baseline = load_baseline(size, args.baseline_dir)
+        if baseline is not None:
+            for regression in find_regressions(result, baseline, args.tolerance):
+                print(f'    REGRESSION {regression}')
+                has_regressions = True
+
+        if args.save:
+            save_baseline(result, args.baseline_dir)
+
+    return 1 if has_regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
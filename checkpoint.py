@@ -0,0 +1,99 @@
+import os
+import pickle
+import struct
+import time
+import zlib
+import logs
+
+simulation_log = logs.get_logger('simulation')
+
+# Start of every snapshot file, followed by the format version and the compressed state
+SNAPSHOT_MAGIC = b'SOFNET-SNAPSHOT\n'
+
+# Layout of the pickled state, bumped whenever a pickled class gains or loses a slot, as a snapshot
+# of another layout cannot be restored:
+# 1: the first layout
+# 2: timelines.Timeline gained gaps, its gap index, and discarded_until, how much of its history the service trimmed
+SNAPSHOT_FORMAT_VERSION = 2
+
+# zlib level of the snapshots: timelines and job dicts compress well, higher levels mostly cost time
+SNAPSHOT_COMPRESSION_LEVEL = 6
+
+
+def write_snapshot(path, architecture, engine_state):
+    '''
+    To write the architecture and the state of the event engine as a compressed pickle, atomically
+
+    The decision trace of the architecture is an open file, so it is not part of the snapshot.
+    '''
+    decision_trace = architecture.get('decision_trace')
+    if decision_trace is not None:
+        decision_trace.flush()
+
+    architecture['decision_trace'] = None
+    try:
+        state = pickle.dumps({'architecture': architecture, 'engine': engine_state}, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        architecture['decision_trace'] = decision_trace
+
+    # Replace the previous snapshot only once the new one is complete
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC + struct.pack('<I', SNAPSHOT_FORMAT_VERSION))
+        file.write(zlib.compress(state, SNAPSHOT_COMPRESSION_LEVEL))
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path):
+    '''
+    To return the architecture and the state of the event engine saved in a snapshot
+    '''
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    header_size = len(SNAPSHOT_MAGIC) + 4
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError(f'{path} is not a simulation snapshot')
+    version, = struct.unpack('<I', data[len(SNAPSHOT_MAGIC):header_size])
+    if version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f'{path} has snapshot format {version}, expected {SNAPSHOT_FORMAT_VERSION}')
+
+    state = pickle.loads(zlib.decompress(data[header_size:]))
+    return state['architecture'], state['engine']
+
+
+class Checkpointer:
+    '''
+    Schedule of the snapshots of a simulation, every simulated_interval ms and/or every wall_interval s
+
+    The path may contain {clock}, replaced by the tick the simulation resumes from, to keep every
+    snapshot instead of only the latest one.
+    '''
+
+    def __init__(self, path, simulated_interval=None, wall_interval=None):
+        if simulated_interval is None and wall_interval is None:
+            raise ValueError('a checkpointer needs a simulated or a wall-clock interval')
+        self.path = path
+        self.simulated_interval = simulated_interval
+        self.wall_interval = wall_interval
+        self.next_tick = None
+        self.next_time = None
+        self.snapshots = 0
+
+    def start(self, counter):
+        if self.simulated_interval is not None:
+            self.next_tick = counter + self.simulated_interval
+        if self.wall_interval is not None:
+            self.next_time = time.monotonic() + self.wall_interval
+
+    def is_due(self, counter):
+        return ((self.next_tick is not None and counter >= self.next_tick)
+                or (self.next_time is not None and time.monotonic() >= self.next_time))
+
+    def save(self, architecture, engine_state):
+        path = self.path.format(clock=engine_state['counter'])
+        write_snapshot(path, architecture, engine_state)
+        self.snapshots += 1
+        simulation_log.info('@%s ms | snapshot written to %s', engine_state['counter'], path)
+        self.start(engine_state['counter'])
+        return path
@@ -0,0 +1,204 @@
+import argparse
+import json
+import logging
+import sys
+
+# Thresholds of the default sweep, as in the experiments of simulate.py
+THRESHOLDS = [round(0.1 * i, 1) for i in range(11)]
+
+
+def add_run_arguments(parser):
+    parser.add_argument('--data', default='files', help='folder with the csvs or the binary scenario of the network')
+    parser.add_argument('--log-level', default='WARNING', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+
+
+def write_output(result, path):
+    if path:
+        with open(path, 'w') as file:
+            json.dump(result, file, indent=2)
+    print(json.dumps(result, indent=2))
+
+
+def run_simulate(args):
+    '''
+    To run one strategy on the network, optionally tracing its decisions and profiling the SOFNET procedures
+    '''
+    import checkpoint
+    import logs
+    import profiling
+    import simulate
+
+    checkpointer = None
+    if args.checkpoint:
+        checkpointer = checkpoint.Checkpointer(args.checkpoint, args.checkpoint_every, args.checkpoint_every_seconds)
+
+    C, F, EU, workload = simulate.load_network(args.data)
+    if args.resume:
+        write_output({'resumed_from': args.resume, **simulate.resume_simulation(args.resume, workload, checkpointer)}, args.output)
+        return 0
+
+    setup, run = simulate.STRATEGIES[args.strategy]
+    architecture = setup(C, F, EU)
+    architecture['SF'] = args.sf
+    architecture['z_score_threshold'] = args.z_score_threshold
+    architecture['prune_infeasible'] = args.prune_infeasible
+    architecture['backfill_gaps'] = args.backfill_gaps
+
+    if args.trace:
+        architecture['decision_trace'] = logs.DecisionTrace(args.trace)
+    if args.profile:
+        profiling.reset()
+        profiling.enable()
+
+    # Only the fdc and cdc baselines can be sharded
+    options = {'checkpointer': checkpointer}
+    if args.shards > 1:
+        options['shards'] = args.shards
+
+    try:
+        performance_ratio = run(workload, architecture, **options)
+    finally:
+        if args.profile:
+            profiling.disable()
+            profiling.export_report(args.profile)
+        if args.trace:
+            architecture['decision_trace'].close()
+
+    write_output({'strategy': args.strategy, 'z_score_threshold': args.z_score_threshold, 'SF': args.sf, **performance_ratio}, args.output)
+    return 0
+
+
+def run_sweep(args):
+    '''
+    To sweep the z-score and SF thresholds of the strategies in a process pool, optionally plotting SR, SC and RU
+    '''
+    import simulate
+    import utils
+
+    C, F, EU, workload = simulate.load_network(args.data)
+    grid = simulate.build_sweep_grid(args.z_score_thresholds, args.sf, args.strategies)
+    results = [dict(point, **performance_ratio) for point, performance_ratio in simulate.run_sweep(C, F, EU, workload, grid, args.processes)]
+    results.sort(key=lambda result: (args.strategies.index(result['strategy']), result['z_score_threshold'], result['SF']))
+    write_output(results, args.output)
+
+    # Plot SR, SC and RU against the z-score threshold, for the first SF
+    if args.plot:
+        count = 0
+        for strategy in args.strategies:
+            series = [result for result in results if result['strategy'] == strategy and result['SF'] == args.sf[0]]
+            X = [result['z_score_threshold'] for result in series]
+            utils.plot(X, [result['SR'] for result in series], 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
+            utils.plot(X, [result['SC'] / 1000 for result in series], 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count + 1)
+            utils.plot(X, [result['RU'] for result in series], 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count + 2)
+            count += 3
+    return 0
+
+
+def run_baseline(args):
+    '''
+    To compare SOFNET with the baselines scheduling only on fdcs or only on cdcs
+    '''
+    args.strategies = ['sofnet', 'fdc', 'cdc']
+    args.z_score_thresholds = [args.z_score_threshold]
+    args.sf = [args.sf]
+    args.plot = False
+    return run_sweep(args)
+
+
+def run_generate(args):
+    import create_workload
+    create_workload.main(args.arguments)
+    return 0
+
+
+def run_benchmark(args):
+    import benchmark
+    return benchmark.main(args.arguments)
+
+
+def run_latency(args):
+    import latency
+    return latency.main(args.arguments)
+
+
+def run_service(args):
+    import service
+    return service.main(args.arguments)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='SOFNET scheduling and load balancing simulations')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help='create the network and workload (see create_workload.py --help)', add_help=False)
+    generate.set_defaults(handler=run_generate)
+
+    simulate = subparsers.add_parser('simulate', help='run one strategy on the network')
+    add_run_arguments(simulate)
+    simulate.add_argument('--strategy', default='sofnet', choices=('sofnet', 'fdc', 'cdc'))
+    simulate.add_argument('--z-score-threshold', type=float, default=0.5)
+    simulate.add_argument('--sf', type=float, default=0.5)
+    simulate.add_argument('--prune-infeasible', action='store_true', help='drop the jobs that can no longer meet their deadline')
+    simulate.add_argument('--backfill-gaps', action='store_true', help='start jobs in the earliest idle gap of a resource that fits them')
+    simulate.add_argument('--shards', type=int, default=1, help='simulate independent regions of the network in this many processes (fdc and cdc strategies)')
+    simulate.add_argument('--checkpoint', help='save snapshots of the simulation to this file ({clock} keeps one per snapshot)')
+    simulate.add_argument('--checkpoint-every', type=int, help='simulated ms between two snapshots')
+    simulate.add_argument('--checkpoint-every-seconds', type=float, help='wall-clock seconds between two snapshots')
+    simulate.add_argument('--resume', help='continue the simulation saved in this snapshot, with its own strategy and thresholds')
+    simulate.add_argument('--trace', help='write the scheduling decisions to this JSON Lines file')
+    simulate.add_argument('--profile', help='write the profiling report of the SOFNET procedures to this JSON file')
+    simulate.add_argument('--output', help='also write the performance ratio to this JSON file')
+    simulate.set_defaults(handler=run_simulate)
+
+    sweep = subparsers.add_parser('sweep', help='sweep the z-score and SF thresholds in parallel')
+    add_run_arguments(sweep)
+    sweep.add_argument('--strategies', nargs='+', default=['sofnet'], choices=('sofnet', 'fdc', 'cdc'))
+    sweep.add_argument('--z-score-thresholds', nargs='+', type=float, default=THRESHOLDS)
+    sweep.add_argument('--sf', nargs='+', type=float, default=[0.5])
+    sweep.add_argument('--processes', type=int, default=None, help='worker processes (1 runs in this process)')
+    sweep.add_argument('--plot', action='store_true', help='save SR, SC and RU plots against the z-score threshold')
+    sweep.add_argument('--output', help='also write the results to this JSON file')
+    sweep.set_defaults(handler=run_sweep)
+
+    baseline = subparsers.add_parser('baseline', help='compare SOFNET with scheduling only on fdcs or only on cdcs')
+    add_run_arguments(baseline)
+    baseline.add_argument('--z-score-threshold', type=float, default=0.5)
+    baseline.add_argument('--sf', type=float, default=0.5)
+    baseline.add_argument('--processes', type=int, default=None)
+    baseline.add_argument('--output', help='also write the results to this JSON file')
+    baseline.set_defaults(handler=run_baseline)
+
+    benchmark = subparsers.add_parser('benchmark', help='time the strategies on seeded networks (see benchmark.py --help)', add_help=False)
+    benchmark.set_defaults(handler=run_benchmark)
+
+    latency = subparsers.add_parser('latency', help='report the latency of the SOFNET decisions (see latency.py --help)', add_help=False)
+    latency.set_defaults(handler=run_latency)
+
+    service = subparsers.add_parser('service', help='serve online placements or load a running service (see service.py --help)', add_help=False)
+    service.set_defaults(handler=run_service)
+
+    return parser
+
+
+# Subcommands whose options are passed on to the script they run
+FORWARDED_COMMANDS = ('generate', 'benchmark', 'latency', 'service')
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, arguments = parser.parse_known_args(argv)
+    if args.command in FORWARDED_COMMANDS:
+        args.arguments = arguments
+    elif arguments:
+        parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+    if args.command == 'simulate' and args.shards > 1 and args.strategy == 'sofnet':
+        parser.error('--shards only applies to the fdc and cdc strategies: SOFNET normalizes the z-scores over the whole job queue')
+
+    if hasattr(args, 'log_level'):
+        import logs
+        logs.configure_logging(getattr(logging, args.log_level))
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,22 @@
+import argparse
+import math
+import os
 import random
 import numpy as np
-import pandas as pd
-import time
+import scenario
+
+# Job categories: classified, restricted and public
+CATEGORIES = np.array(['tc', 'tr', 'tp'])
+
+# Arrival processes of generate_workload
+ARRIVAL_PROCESSES = ('batch', 'poisson', 'bursty', 'diurnal')
+
+# Default arrival rate (in jobs/s), mean jobs per burst and period of the diurnal cycle (in ms)
+ARRIVAL_RATE = 100
+MEAN_BURST_SIZE = 50
+BURST_SPREAD = 100
+DIURNAL_PERIOD = 24 * 60 * 60 * 1000
+DIURNAL_AMPLITUDE = 0.8
 
 def set_up_cdcs(count):
     '''
@@ -60,55 +75,133 @@ def set_up_eus(count):
     return eus
 
 
-def set_up_workload(EU, N):
+def generate_poisson_arrivals(rng, N, rate):
+    '''
+    To draw N arrival times (in ms) of a Poisson process of rate jobs/s
+    '''
+    return np.cumsum(rng.exponential(1000 / rate, N))
+
+
+def generate_bursty_arrivals(rng, N, rate, mean_burst_size=MEAN_BURST_SIZE, burst_spread=BURST_SPREAD):
     '''
-    To configure jobs and return the workload
+    To draw N arrival times (in ms) arriving in bursts: bursts start as a Poisson process, hold a geometric
+    number of jobs (mean_burst_size on average) and spread their jobs uniformly over burst_spread ms
     '''
-   
-    workload = []
-    for i in range(1, N+1):
-        job = {}
-        job['id'] = f'job_{i}'
-        job['category'] = random.choice(['tc', 'tr', 'tp'])
-        job['instructions'] = random.choice(range(1000, 10000))
-        job['arrival_time'] = 0
-        job['deadline'] = job['arrival_time'] + 1000 * random.choice(range(1, 121))
-        job['eu'] = random.choice(EU)['id']
-        workload.append(job)
-    return workload
-    
-# No. of cdcs, no. of fdcs, no. of end-users, and no. of jobs
-# g, h, e, N = 10, 25, 50, 1000
-# g, h, e, N = 15, 50, 100, 300
-# g, h, e, N = 10, 25, 100, 500
-g, h, e, N = 50, 150, 300, 500
+    n_bursts = max(1, math.ceil(2 * N / mean_burst_size))
+    sizes = rng.geometric(1 / mean_burst_size, n_bursts)
+    while sizes.sum() < N:
+        sizes = np.concatenate([sizes, rng.geometric(1 / mean_burst_size, n_bursts)])
+
+    burst_starts = np.cumsum(rng.exponential(1000 * mean_burst_size / rate, len(sizes)))
+    arrivals = np.repeat(burst_starts, sizes)[:N] + rng.uniform(0, burst_spread, N)
+    return np.sort(arrivals)
+
+
+def generate_diurnal_arrivals(rng, N, rate, period=DIURNAL_PERIOD, amplitude=DIURNAL_AMPLITUDE):
+    '''
+    To draw N arrival times (in ms) of a Poisson process whose rate follows a daily cycle,
+    rate * (1 + amplitude * sin(2 pi t / period)), by time-rescaling a unit-rate process
+    '''
+    if not 0 <= amplitude < 1:
+        raise ValueError(f'The amplitude of the diurnal cycle must be in [0, 1), not {amplitude}')
+
+    # Expected number of arrivals by time t (in ms), sampled finely enough to be inverted by interpolation
+    unit_arrivals = np.cumsum(rng.exponential(1.0, N))
+    horizon = 1000 * (unit_arrivals[-1] + 1) / (rate * (1 - amplitude))
+    t = np.linspace(0, horizon, max(2, min(10 * N, 10 ** 7)))
+    expected = rate / 1000 * (t + amplitude * period / (2 * np.pi) * (1 - np.cos(2 * np.pi * t / period)))
+    return np.interp(unit_arrivals, expected, t)
+
+
+def generate_workload(EU_ids, N, seed=None, arrival_process='batch', rate=ARRIVAL_RATE, **process_parameters):
+    '''
+    To generate N jobs at once with numpy, in order of arrival time, as a workload DataFrame
+
+    The arrival process is one of 'batch' (all jobs at t = 0), 'poisson', 'bursty' or 'diurnal',
+    at an average of rate jobs/s. Deadlines are 1 to 120 s after arrival.
+    '''
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+
+    if arrival_process == 'batch':
+        arrival_times = np.zeros(N, dtype=np.int64)
+    elif arrival_process == 'poisson':
+        arrival_times = generate_poisson_arrivals(rng, N, rate, **process_parameters).astype(np.int64)
+    elif arrival_process == 'bursty':
+        arrival_times = generate_bursty_arrivals(rng, N, rate, **process_parameters).astype(np.int64)
+    elif arrival_process == 'diurnal':
+        arrival_times = generate_diurnal_arrivals(rng, N, rate, **process_parameters).astype(np.int64)
+    else:
+        raise ValueError(f'Unknown arrival process {arrival_process}, expected one of {ARRIVAL_PROCESSES}')
+
+    EU_ids = np.asarray(EU_ids)
+    return pd.DataFrame({'id': np.char.add('job_', np.arange(1, N + 1).astype(str)),
+                         'category': CATEGORIES[rng.integers(0, len(CATEGORIES), N)],
+                         'instructions': rng.integers(1000, 10000, N),
+                         'arrival_time': arrival_times,
+                         'deadline': arrival_times + 1000 * rng.integers(1, 121, N),
+                         'eu': EU_ids[rng.integers(0, len(EU_ids), N)]})
+
+
+def set_up_network(g, h, e, N, seed=None, arrival_process='batch', rate=ARRIVAL_RATE):
+    '''
+    To set-up g cdcs, h fdcs, e end-users and a workload DataFrame of N IoT jobs, reproducibly when a seed is given
+    '''
+    if seed is not None:
+        random.seed(seed)
+
+    C, F, EU = set_up_cdcs(g), set_up_fdcs(h), set_up_eus(e)
+    J = generate_workload([eu['id'] for eu in EU], N, seed, arrival_process, rate)
+    return C, F, EU, J
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create the network and workload csvs in a folder')
+    parser.add_argument('--data', default='files', help='folder to write the csvs and the binary scenario to')
+    parser.add_argument('--cdcs', type=int, default=50)
+    parser.add_argument('--fdcs', type=int, default=150)
+    parser.add_argument('--eus', type=int, default=300)
+    parser.add_argument('--jobs', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--arrivals', default='batch', choices=ARRIVAL_PROCESSES)
+    parser.add_argument('--rate', type=float, default=ARRIVAL_RATE, help='average arrivals per second')
+    parser.add_argument('--format', default='csv', choices=('csv', 'npy', 'both'),
+                        help='write the csvs in the folder, the binary scenario in its scenario/ subfolder, or both')
+    args = parser.parse_args(argv)
+
+    # No. of cdcs, no. of fdcs, no. of end-users, and no. of jobs
+    # g, h, e, N = 10, 25, 50, 1000
+    # g, h, e, N = 15, 50, 100, 300
+    # g, h, e, N = 10, 25, 100, 500
+    g, h, e, N = args.cdcs, args.fdcs, args.eus, args.jobs
+
+    # Set-up cdcs, fdcs, end-users, and IoT jobs
+    C, F, EU, workload_df = set_up_network(g, h, e, N, args.seed, args.arrivals, args.rate)
 
-# Set-up cdcs, fdcs, end-users, and IoT jobs
-C, F, EU = set_up_cdcs(g), set_up_fdcs(h), set_up_eus(e)
-J = set_up_workload(EU, N)
+    import pandas as pd
 
-print(C)
-print(F)
-print(EU)
-for job in J:
-    print(job)
+    cdc_df, fdc_df, eu_df = pd.DataFrame.from_dict(C), pd.DataFrame.from_dict(F), pd.DataFrame.from_dict(EU)
 
-# Export the CDCs
-cdc_df = pd.DataFrame.from_dict(C)
-cdc_df.to_csv('files/CDCs.csv', index=False)
+    if args.format in ('npy', 'both'):
+        # Export the binary scenario
+        scenario.write_scenario(os.path.join(args.data, 'scenario'), cdc_df, fdc_df, eu_df, workload_df)
 
-# Export the FDCs
-fdc_df = pd.DataFrame.from_dict(F)
-fdc_df.to_csv('files/FDCs.csv', index=False)
+    if args.format in ('csv', 'both'):
+        os.makedirs(args.data, exist_ok=True)
 
-# Export the end-users
-eu_df = pd.DataFrame.from_dict(EU)
-eu_df.to_csv('files/EUs.csv', index=False)
+        # Export the CDCs
+        cdc_df.to_csv(os.path.join(args.data, 'CDCs.csv'), index=False)
 
-# Export workload
-workload_df = pd.DataFrame.from_dict(J)
-workload_df.to_csv('files/workload.csv', index=False)
+        # Export the FDCs
+        fdc_df.to_csv(os.path.join(args.data, 'FDCs.csv'), index=False)
 
+        # Export the end-users
+        eu_df.to_csv(os.path.join(args.data, 'EUs.csv'), index=False)
 
+        # Export workload, in order of arrival time
+        workload_df.to_csv(os.path.join(args.data, 'workload.csv'), index=False)
 
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+import profiling
+import simulate
+import sofnet
+
+# Smallest and largest latency (in s) the histograms tell apart
+HISTOGRAM_MIN_SECONDS = 1e-7
+HISTOGRAM_MAX_SECONDS = 100
+
+# Buckets per doubling of the latency: a percentile is at most 2 ** (1 / 16) - 1 = 4.4% above the true one
+HISTOGRAM_BUCKETS_PER_DOUBLING = 16
+
+# Percentiles reported for each histogram
+REPORTED_PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    '''
+    Histogram of latencies in logarithmic buckets, whose memory does not grow with the number of samples
+
+    Bucket i counts the latencies in (min_seconds * g ** (i - 1), min_seconds * g ** i], with g the
+    growth of a bucket. Percentiles are read as the upper bound of their bucket (capped by the
+    largest latency, which is kept exactly), so they are never under-estimated.
+    '''
+
+    def __init__(self, min_seconds=HISTOGRAM_MIN_SECONDS, max_seconds=HISTOGRAM_MAX_SECONDS, buckets_per_doubling=HISTOGRAM_BUCKETS_PER_DOUBLING):
+        self.min_seconds = min_seconds
+        self.log_growth = math.log(2) / buckets_per_doubling
+        self.counts = [0] * (math.ceil(math.log(max_seconds / min_seconds) / self.log_growth) + 1)
+        self.count = 0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        if seconds <= self.min_seconds:
+            bucket = 0
+        else:
+            bucket = min(math.ceil(math.log(seconds / self.min_seconds) / self.log_growth), len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+
+    def percentile(self, percentile):
+        '''
+        To return the latency (in s) below which the given percentage of the samples lie
+        '''
+        if not self.count:
+            return None
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.min_seconds * math.exp(bucket * self.log_growth), self.max_seconds)
+        return self.max_seconds
+
+    def summary(self):
+        summary = {'count': self.count}
+        for percentile in REPORTED_PERCENTILES:
+            value = self.percentile(percentile)
+            summary[f'p{percentile}_us'] = None if value is None else round(1e6 * value, 3)
+        summary['max_us'] = round(1e6 * self.max_seconds, 3)
+        return summary
+
+
+class DecisionLatencies:
+    '''
+    Latency histograms of the scheduling decisions, by job category and by decision branch, and of the scheduling passes
+
+    A decision is one call of sofnet.allocate_job, so a job left in the queue is decided again by a later
+    pass. Its branch is the last numbered step of Procedures 1-4 it went through (e.g. "migration:12"), or
+    the name of a branch without a number (e.g. "migration:keep_on_fp", see profiling.BRANCH_NAMES),
+    "dropped" when it was pruned. When the trace is replayed in real time, the response latency of a job
+    runs from its arrival until it is scheduled or dropped.
+    '''
+
+    def __init__(self):
+        self.decisions = LatencyHistogram()
+        self.categories = defaultdict(LatencyHistogram)
+        self.branches = defaultdict(LatencyHistogram)
+        self.passes = LatencyHistogram()
+        self.responses = defaultdict(LatencyHistogram)
+
+    def record_decision(self, job, branch, seconds):
+        self.decisions.record(seconds)
+        self.categories[job['category']].record(seconds)
+        self.branches[branch].record(seconds)
+
+    def record_response(self, job, seconds):
+        self.responses[job['category']].record(seconds)
+
+    def report(self):
+        return {'decisions': self.decisions.summary(),
+                'categories': {category: histogram.summary() for category, histogram in sorted(self.categories.items())},
+                'branches': {branch: histogram.summary() for branch, histogram in sorted(self.branches.items())},
+                'passes': self.passes.summary(),
+                'responses': {category: histogram.summary() for category, histogram in sorted(self.responses.items())}}
+
+
+def fetch_branch(architecture, job):
+    if job['id'] in architecture['dropped_jobs']:
+        return 'dropped'
+    if profiling.LAST_STEP is None:
+        return 'unknown'
+    procedure, step = profiling.LAST_STEP
+    return f'{procedure}:{step}'
+
+
+@contextlib.contextmanager
+def record_decision_latencies(latencies, started_at=None):
+    '''
+    To time every call of sofnet.allocate_job within the block, counting the steps to know its branch
+
+    Given the wall time at which the replay started, the response latency of each job leaving the queue is recorded as well.
+    '''
+    allocate_job = sofnet.allocate_job
+
+    def timed_allocate_job(architecture, job):
+        profiling.LAST_STEP = None
+        start = time.perf_counter()
+        architecture = allocate_job(architecture, job)
+        end = time.perf_counter()
+        latencies.record_decision(job, fetch_branch(architecture, job), end - start)
+
+        if started_at is not None and (job['id'] in architecture['executed_jobs'] or job['id'] in architecture['dropped_jobs']):
+            latencies.record_response(job, end - started_at - job['arrival_time'] / 1000)
+        return architecture
+
+    # Profiling that is already enabled counts the steps as well
+    is_profiling = profiling.ENABLED
+    sofnet.allocate_job = timed_allocate_job
+    if not is_profiling:
+        profiling.enable(time_procedures=False)
+    try:
+        yield latencies
+    finally:
+        if not is_profiling:
+            profiling.disable()
+        sofnet.allocate_job = allocate_job
+
+
+def retime_arrivals(arrivals, rate):
+    '''
+    To make job i arrive i / rate s after the start, keeping the time each job has until its deadline
+    '''
+    for i, job in enumerate(arrivals):
+        arrival_time = int(1000 * i / rate)
+        yield dict(job, arrival_time=arrival_time, deadline=arrival_time + job['deadline'] - job['arrival_time'])
+
+
+def replay_trace(workload, architecture, rate=None, jobs=None):
+    '''
+    To run SOFNET over the jobs of a workload, recording the latency of each decision and of each pass
+
+    Without a rate the trace runs as fast as possible, with its own arrival times. Given a rate (in
+    jobs/s), the jobs arrive at that rate and the trace is replayed in real time: each pass waits until
+    the wall clock reaches its tick, so a scheduler that cannot keep up shows in the response latencies.
+    '''
+    arrivals = simulate.fetch_arrivals(workload)
+    if jobs is not None:
+        arrivals = itertools.islice(arrivals, jobs)
+    if rate is not None:
+        arrivals = retime_arrivals(arrivals, rate)
+
+    latencies = DecisionLatencies()
+    started_at = time.perf_counter()
+
+    def paced_algorithm(architecture, job_queue):
+        if rate is not None:
+            delay = started_at + architecture['clock'] / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        start = time.perf_counter()
+        architecture = sofnet.algorithm(architecture, job_queue)
+        latencies.passes.record(time.perf_counter() - start)
+        return architecture
+
+    with record_decision_latencies(latencies, started_at if rate is not None else None):
+        simulate.run_event_simulation(arrivals, architecture, paced_algorithm)
+
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a workload through SOFNET and report the latency of its scheduling decisions')
+    parser.add_argument('--data', default='files', help='folder with the csvs or the binary scenario of the network')
+    parser.add_argument('--jobs', type=int, default=None, help='replay only the first jobs of the workload')
+    parser.add_argument('--rate', type=float, default=None, help='replay in real time at this many jobs/s')
+    parser.add_argument('--z-score-threshold', type=float, default=0.5)
+    parser.add_argument('--sf', type=float, default=0.5)
+    parser.add_argument('--prune-infeasible', action='store_true', help='drop the jobs that can no longer meet their deadline')
+    parser.add_argument('--output', help='also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    C, F, EU, workload = simulate.load_network(args.data)
+    architecture = simulate.setup_architecture(C, F, EU)
+    architecture['SF'] = args.sf
+    architecture['z_score_threshold'] = args.z_score_threshold
+    architecture['prune_infeasible'] = args.prune_infeasible
+
+    report = replay_trace(workload, architecture, args.rate, args.jobs).report()
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
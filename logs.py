@@ -0,0 +1,72 @@
+import json
+import logging
+
+# Subsystems with their own logger (sofnet.<subsystem>), each of which can be switched on separately
+SUBSYSTEMS = ('scheduler', 'constraints', 'network', 'metrics', 'simulation')
+
+
+def get_logger(subsystem):
+    return logging.getLogger(f'sofnet.{subsystem}')
+
+
+def configure_logging(level=logging.WARNING, subsystems=None, stream=None):
+    '''
+    To set the level of all sofnet loggers, optionally overriding it per subsystem (e.g. {'constraints': logging.DEBUG})
+
+    Messages are passed as %-style arguments, so nothing is formatted for a disabled level.
+    '''
+    logger = logging.getLogger('sofnet')
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(name)s | %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+    for subsystem in SUBSYSTEMS:
+        get_logger(subsystem).setLevel(logging.NOTSET)
+    for subsystem, subsystem_level in (subsystems or {}).items():
+        get_logger(subsystem).setLevel(subsystem_level)
+
+    return logger
+
+
+class DecisionTrace:
+    '''
+    Buffered JSON Lines sink for scheduling decisions, written to disk in blocks of buffer_size records
+    '''
+
+    def __init__(self, path, buffer_size=4096):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.file = open(path, 'w')
+
+    def record(self, decision):
+        self.buffer.append(decision)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(''.join(json.dumps(decision, default=int) + '\n' for decision in self.buffer))
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_decision_trace(path):
+    '''
+    To load the scheduling decisions written by a DecisionTrace
+    '''
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
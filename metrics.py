@@ -0,0 +1,100 @@
+import utils
+
+
+class PerformanceMetrics:
+    '''
+    Running success ratio and system cost of a simulation, updated in O(1) per scheduled or dropped job
+
+    The values can be read at any point of the run; once it ends they equal the ones of
+    utils.calculate_success_ratio and utils.calculate_system_cost.
+    '''
+
+    def __init__(self):
+        self.scheduled_jobs = 0
+        self.dropped_jobs = 0
+        self.jobs_before_deadline = 0
+        self.execution_time = 0
+
+    def record_job(self, start_time, end_time, deadline):
+        self.scheduled_jobs += 1
+        if end_time <= deadline:
+            self.jobs_before_deadline += 1
+        self.execution_time += end_time - start_time
+
+    def record_drop(self):
+        self.dropped_jobs += 1
+
+    def merge(self, other):
+        '''
+        To add the jobs recorded by another run, such as one shard of a sharded simulation
+        '''
+        self.scheduled_jobs += other.scheduled_jobs
+        self.dropped_jobs += other.dropped_jobs
+        self.jobs_before_deadline += other.jobs_before_deadline
+        self.execution_time += other.execution_time
+
+    def success_ratio(self):
+        '''
+        To return the share of jobs ending before their deadline, dropped jobs counting as missed
+        '''
+        total_jobs = self.scheduled_jobs + self.dropped_jobs
+        return self.jobs_before_deadline / total_jobs if total_jobs else 0.0
+
+    def system_cost(self, architecture):
+        return utils.calculate_set_up_cost(architecture['C'], architecture['F']) + self.execution_time
+
+    def resource_utilization(self, architecture):
+        '''
+        To read the resource utilization accumulated so far, as utils.calculate_resource_utilization does at the end
+        '''
+        if architecture['end_at'] <= 0:
+            return 0.0
+        return utils.calculate_resource_utilization(architecture)
+
+    def performance_ratio(self, architecture):
+        return {'SR': self.success_ratio(),
+                'SC': self.system_cost(architecture),
+                'RU': self.resource_utilization(architecture)}
+
+
+class UtilizationTracker:
+    '''
+    Utilization of every resource as a step function of time, integrated only when it changes
+
+    The utilization of a resource (100 * used / total capacity) stays constant between two
+    allocations or frees, so its area is added up in O(1) per change instead of once per tick.
+    A level set at tick t holds from t on.
+    '''
+
+    def __init__(self, resource_ids=()):
+        self.resource_ids = list(resource_ids)
+        self.index = {resource_id: i for i, resource_id in enumerate(self.resource_ids)}
+        self.levels = [0.0] * len(self.resource_ids)
+        self.since = [0] * len(self.resource_ids)
+        self.accumulated = [0.0] * len(self.resource_ids)
+        self.is_tracking = True
+
+    def change(self, resource_id, level, tick):
+        if not self.is_tracking:
+            return
+        i = self.index[resource_id]
+        self.accumulated[i] += self.levels[i] * (tick - self.since[i])
+        self.levels[i] = level
+        self.since[i] = tick
+
+    def fetch_state(self, resource_id):
+        i = self.index[resource_id]
+        return self.levels[i], self.since[i], self.accumulated[i]
+
+    def restore_state(self, resource_id, state):
+        i = self.index[resource_id]
+        self.levels[i], self.since[i], self.accumulated[i] = state
+
+    def areas(self, until=None):
+        '''
+        To return the area under the utilization of every resource, up to (excluding) tick until if given
+        '''
+        if until is None:
+            return dict(zip(self.resource_ids, self.accumulated))
+        return {resource_id: accumulated + level * max(until - since, 0)
+                for resource_id, accumulated, level, since in zip(self.resource_ids, self.accumulated, self.levels, self.since)}
@@ -0,0 +1,169 @@
+import contextlib
+import functools
+import json
+import time
+from collections import Counter, defaultdict
+import logs
+import sofnet
+
+metrics_log = logs.get_logger('metrics')
+
+# Whether the step counters and procedure timers are recording
+ENABLED = False
+
+# Procedures of sofnet that are timed while profiling is enabled
+PROFILED_PROCEDURES = ('algorithm',
+                       'allocate_classified_jobs',
+                       'allocate_restricted_jobs',
+                       'allocate_public_jobs',
+                       'migration',
+                       'check_fdc_deadline_constraint',
+                       'check_fdc_space_constraint',
+                       'check_cdc_deadline_constraint',
+                       'check_cdc_space_constraint')
+
+# Calls and cumulative time (in s) of each profiled procedure
+CALLS = Counter()
+SECONDS = Counter()
+
+# How often each numbered step of Procedures 1-4 fired, and how often a job was left to be scheduled later
+STEPS = defaultdict(Counter)
+TRY_LATER = Counter()
+
+# Branches of the implementation that have no numbered step in Procedures 1-4, counted by name:
+# keep_on_fp (migration): a restricted or public job that would wait longer anywhere else stays on fp
+# try_later (public): a public job that satisfies none of the conditions is left in the queue
+BRANCH_NAMES = ('keep_on_fp', 'try_later')
+BRANCHES = defaultdict(Counter)
+
+# Original procedures, while the timed wrappers are installed
+ORIGINALS = {}
+
+# Last step counted, i.e. the branch taken by the latest decision: (procedure, step or branch name)
+LAST_STEP = None
+
+
+def count_step(procedure, step):
+    '''
+    To count one firing of a numbered step of a procedure, when profiling is enabled
+    '''
+    global LAST_STEP
+    if ENABLED:
+        STEPS[procedure][step] += 1
+        LAST_STEP = (procedure, step)
+
+
+def count_branch(procedure, branch):
+    '''
+    To count one firing of a branch of a procedure that has no numbered step (see BRANCH_NAMES), when profiling is enabled
+    '''
+    global LAST_STEP
+    if ENABLED:
+        BRANCHES[procedure][branch] += 1
+        LAST_STEP = (procedure, branch)
+
+
+def count_try_later(procedure, step=None):
+    '''
+    To count a job left in the queue by a procedure, at a numbered step or else as its try_later branch, when profiling is enabled
+    '''
+    if step is None:
+        count_branch(procedure, 'try_later')
+    else:
+        count_step(procedure, step)
+    if ENABLED:
+        TRY_LATER[procedure] += 1
+
+
+def time_procedure(name, function):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            SECONDS[name] += time.perf_counter() - start
+            CALLS[name] += 1
+    return timed
+
+
+def enable(time_procedures=True):
+    '''
+    To start counting the steps and timing the procedures of sofnet, replacing them by timed wrappers
+
+    With time_procedures=False only the steps are counted, leaving the procedures unwrapped.
+    '''
+    global ENABLED
+    if ENABLED:
+        return
+    for name in PROFILED_PROCEDURES if time_procedures else ():
+        ORIGINALS[name] = getattr(sofnet, name)
+        setattr(sofnet, name, time_procedure(name, ORIGINALS[name]))
+    ENABLED = True
+
+
+def disable():
+    '''
+    To stop profiling and restore the original procedures, keeping what was recorded so far
+    '''
+    global ENABLED
+    for name, function in ORIGINALS.items():
+        setattr(sofnet, name, function)
+    ORIGINALS.clear()
+    ENABLED = False
+
+
+def reset():
+    CALLS.clear()
+    SECONDS.clear()
+    STEPS.clear()
+    TRY_LATER.clear()
+    BRANCHES.clear()
+
+
+@contextlib.contextmanager
+def profile():
+    '''
+    To profile the runs within the block, starting from clean counters
+    '''
+    reset()
+    enable()
+    try:
+        yield
+    finally:
+        disable()
+
+
+def report():
+    '''
+    To return the calls, cumulative and mean time of each procedure, and the step and branch counters
+
+    Times are inclusive: allocate_* includes the constraint checks and the migration it calls.
+    '''
+    procedures = {}
+    for name in PROFILED_PROCEDURES:
+        if CALLS[name]:
+            procedures[name] = {'calls': CALLS[name],
+                                'seconds': round(SECONDS[name], 6),
+                                'mean_us': round(1e6 * SECONDS[name] / CALLS[name], 3)}
+
+    return {'procedures': procedures,
+            'steps': {procedure: {str(step): count for step, count in sorted(steps.items())} for procedure, steps in STEPS.items()},
+            'branches': {procedure: dict(sorted(branches.items())) for procedure, branches in BRANCHES.items()},
+            'try_later': dict(TRY_LATER)}
+
+
+def export_report(path):
+    with open(path, 'w') as file:
+        json.dump(report(), file, indent=2)
+
+
+def log_report():
+    profile_report = report()
+    for name, procedure in profile_report['procedures'].items():
+        metrics_log.info('%s | %s calls | %.3f s | %.3f us/call', name, procedure['calls'], procedure['seconds'], procedure['mean_us'])
+    for procedure, steps in profile_report['steps'].items():
+        metrics_log.info('%s steps | %s', procedure, steps)
+    for procedure, branches in profile_report['branches'].items():
+        metrics_log.info('%s branches | %s', procedure, branches)
+    metrics_log.info('Try scheduling later | %s', profile_report['try_later'])
@@ -0,0 +1,140 @@
+import numbers
+import numpy as np
+
+
+def infer_column(values):
+    '''
+    To store an attribute as a contiguous int64/float64 array when it is numeric, or as a list otherwise
+    '''
+    if all(isinstance(value, numbers.Integral) and not isinstance(value, bool) for value in values):
+        return np.array(values, dtype=np.int64)
+    if all(isinstance(value, numbers.Real) and not isinstance(value, bool) for value in values):
+        return np.array(values, dtype=np.float64)
+    return list(values)
+
+
+class ResourceView:
+    '''
+    Dict-like view on one row of a resource table, so that F[fdc_id]['used_capacity'] += job_size keeps working
+    '''
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        column = self.table.columns[key]
+        return column.item(self.index) if isinstance(column, np.ndarray) else column[self.index]
+
+    def __setitem__(self, key, value):
+        columns = self.table.columns
+        if key not in columns:
+            columns[key] = [None] * len(self.table)
+        column = columns[key]
+
+        # Keep integer columns integral, widen them when a float is stored
+        if isinstance(column, np.ndarray) and column.dtype == np.int64 and not isinstance(value, numbers.Integral):
+            column = columns[key] = column.astype(np.float64) if isinstance(value, numbers.Real) else column.tolist()
+        column[self.index] = value
+
+    def __contains__(self, key):
+        return key in self.table.columns
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self):
+        return len(self.table.columns)
+
+    def keys(self):
+        return self.table.columns.keys()
+
+    def values(self):
+        return [self[key] for key in self.table.columns]
+
+    def items(self):
+        return [(key, self[key]) for key in self.table.columns]
+
+    def get(self, key, default=None):
+        return self[key] if key in self.table.columns else default
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class ResourceTable:
+    '''
+    Struct-of-arrays store of cdcs or fdcs: one contiguous array per attribute and an id to index map
+
+    The table behaves like the dict of per-resource dicts it replaces (C[cdc_id]['total_Mips']),
+    while capacity and utilization can also be queried for all resources at once.
+    '''
+
+    def __init__(self, resources):
+        records = list(resources.values()) if hasattr(resources, 'values') else list(resources)
+        self.ids = [record['id'] for record in records]
+        self.index = {id: i for i, id in enumerate(self.ids)}
+
+        keys = []
+        for record in records:
+            keys.extend(key for key in record.keys() if key not in keys)
+        self.columns = {key: infer_column([record.get(key) for record in records]) for key in keys}
+        self.views = [ResourceView(self, i) for i in range(len(self.ids))]
+
+    def __getitem__(self, id):
+        return self.views[self.index[id]]
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keys(self):
+        return list(self.ids)
+
+    def values(self):
+        return list(self.views)
+
+    def items(self):
+        return list(zip(self.ids, self.views))
+
+    def column(self, key):
+        '''
+        To return the contiguous array of an attribute across all resources
+        '''
+        return self.columns[key]
+
+    def available_capacity(self):
+        '''
+        To return the capacity left on every resource
+        '''
+        return self.columns['total_capacity'] - self.columns['used_capacity']
+
+    def utilization(self):
+        '''
+        To return the ratio of current usage with total capacity of every resource
+        '''
+        return self.columns['used_capacity'] / self.columns['total_capacity']
+
+    def to_records(self):
+        '''
+        To export the resources back as a dict of per-resource dicts
+        '''
+        return {id: view.to_dict() for id, view in zip(self.ids, self.views)}
+
+    def __getstate__(self):
+        return {'ids': self.ids, 'columns': self.columns}
+
+    def __setstate__(self, state):
+        self.ids = state['ids']
+        self.index = {id: i for i, id in enumerate(self.ids)}
+        self.columns = state['columns']
+        self.views = [ResourceView(self, i) for i in range(len(self.ids))]
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import numpy as np
+
+# Folder of the binary scenario written next to the csvs
+SCENARIO_DIR = 'files/scenario'
+
+# Tables of a scenario, named after the csvs they are converted from
+SCENARIO_TABLES = ('CDCs', 'FDCs', 'EUs', 'workload')
+
+# Version of the layout: <scenario>/scenario.json and one <scenario>/<table>/<column>.npy per column
+SCENARIO_FORMAT_VERSION = 1
+
+# Jobs turned into dicts at once when iterating over a scenario workload
+WORKLOAD_BLOCK_SIZE = 65536
+
+
+def to_column(values):
+    '''
+    To store a column as a typed array that can be memory-mapped: numbers as they are, text as fixed-width unicode
+    '''
+    import pandas as pd
+
+    values = np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        return values
+    if pd.isna(values).all():
+        return np.full(len(values), np.nan)
+    return values.astype(str)
+
+
+def write_table(directory, name, frame):
+    '''
+    To write a DataFrame (or a list of records) as one .npy file per column, returning the column names
+    '''
+    import pandas as pd
+
+    frame = pd.DataFrame(frame)
+    os.makedirs(os.path.join(directory, name), exist_ok=True)
+    for column in frame.columns:
+        np.save(os.path.join(directory, name, f'{column}.npy'), to_column(frame[column].to_numpy()))
+    return list(frame.columns)
+
+
+def write_scenario(directory, C, F, EU, workload):
+    '''
+    To write the resources, end-users and workload as a binary scenario
+
+    The workload is stored in order of arrival time, jobs arriving together sorted by deadline,
+    so that it can be streamed into the simulation as it is.
+    '''
+    import pandas as pd
+
+    workload = pd.DataFrame(workload).sort_values(by=['arrival_time', 'deadline'], kind='stable')
+    tables = {}
+    for name, frame in zip(SCENARIO_TABLES, (C, F, EU, workload)):
+        tables[name] = {'columns': write_table(directory, name, frame), 'rows': len(frame)}
+
+    with open(os.path.join(directory, 'scenario.json'), 'w') as file:
+        json.dump({'version': SCENARIO_FORMAT_VERSION, 'tables': tables}, file, indent=2)
+
+
+def convert_csv_scenario(csv_dir='files', directory=SCENARIO_DIR):
+    '''
+    To convert CDCs.csv, FDCs.csv, EUs.csv and workload.csv into a binary scenario
+    '''
+    import pandas as pd
+
+    C, F, EU, workload = (pd.read_csv(os.path.join(csv_dir, f'{name}.csv')) for name in SCENARIO_TABLES)
+    write_scenario(directory, C, F, EU, workload)
+
+
+def read_metadata(directory):
+    with open(os.path.join(directory, 'scenario.json')) as file:
+        metadata = json.load(file)
+    if metadata['version'] != SCENARIO_FORMAT_VERSION:
+        raise ValueError(f"{directory} has scenario format {metadata['version']}, expected {SCENARIO_FORMAT_VERSION}")
+    return metadata
+
+
+def load_table(directory, name, metadata=None):
+    '''
+    To memory-map the columns of a table, without reading them
+    '''
+    metadata = metadata or read_metadata(directory)
+    return {column: np.load(os.path.join(directory, name, f'{column}.npy'), mmap_mode='r')
+            for column in metadata['tables'][name]['columns']}
+
+
+def load_records(directory, name, metadata=None):
+    '''
+    To load a table as a dict of records by id, as simulate.register_resources builds from a csv
+    '''
+    columns = load_table(directory, name, metadata)
+    values = [column.tolist() for column in columns.values()]
+    return {record['id']: record for record in (dict(zip(columns, row)) for row in zip(*values))}
+
+
+class ScenarioWorkload:
+    '''
+    Workload of a binary scenario, iterated in order of arrival time from its memory-mapped columns
+
+    Only one block of jobs is turned into dicts at a time, and every iteration starts from the first job,
+    so the same workload can be simulated several times. Given eu_ids, only the jobs of these end-users
+    are iterated over (len still counts all jobs). It pickles as its path.
+    '''
+
+    def __init__(self, directory, block_size=WORKLOAD_BLOCK_SIZE, eu_ids=None):
+        self.directory = directory
+        self.block_size = block_size
+        self.eu_ids = None if eu_ids is None else np.asarray(eu_ids, dtype=str)
+        self.columns = load_table(directory, 'workload')
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __iter__(self):
+        names = list(self.columns)
+        for start in range(0, len(self), self.block_size):
+            block = [self.columns[name][start:start + self.block_size] for name in names]
+            if self.eu_ids is not None:
+                is_selected = np.isin(self.columns['eu'][start:start + self.block_size], self.eu_ids)
+                block = [column[is_selected] for column in block]
+            for row in zip(*(column.tolist() for column in block)):
+                yield dict(zip(names, row))
+
+    def __getstate__(self):
+        return {'directory': self.directory, 'block_size': self.block_size, 'eu_ids': self.eu_ids}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['block_size'], state.get('eu_ids'))
+
+
+def load_scenario(directory=SCENARIO_DIR):
+    '''
+    To load the resources and end-users of a binary scenario, and its workload as a ScenarioWorkload
+    '''
+    metadata = read_metadata(directory)
+    C = load_records(directory, 'CDCs', metadata)
+    F = load_records(directory, 'FDCs', metadata)
+    EU = load_records(directory, 'EUs', metadata)
+    return C, F, EU, ScenarioWorkload(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert the csvs of a scenario into the binary scenario format')
+    parser.add_argument('csv_dir', nargs='?', default='files')
+    parser.add_argument('directory', nargs='?', default=SCENARIO_DIR)
+    args = parser.parse_args(argv)
+    convert_csv_scenario(args.csv_dir, args.directory)
+
+
+if __name__ == '__main__':
+    main()
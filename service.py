@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import sys
+import time
+import logs
+import simulate
+import sofnet
+
+simulation_log = logs.get_logger('simulation')
+
+# Address the service listens on
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+
+# Submitted jobs waiting for a micro-batch; once full, the connections are no longer read (backpressure)
+MAX_QUEUED_JOBS = 10000
+
+# Largest micro-batch, and the longest (in ms) a job waits for more jobs to join its micro-batch
+MICRO_BATCH_SIZE = 256
+MICRO_BATCH_WINDOW = 5
+
+# Categories a submitted job may have
+JOB_CATEGORIES = ('tc', 'tr', 'tp')
+
+# Simulated ms between two times the service forgets the jobs that ended on their resources
+TRIM_INTERVAL = 1000
+
+# Jobs sent by the load generator, and its target rate (in jobs/s) and connections
+LOAD_JOBS = 10000
+LOAD_RATE = 1000
+LOAD_CONNECTIONS = 4
+
+
+class PlacementRecorder:
+    '''
+    Decision trace of the service, answering the submission of each job once it is scheduled or dropped
+
+    Deferred jobs stay in the queue of the architecture and are answered by a later pass.
+    Decisions are also written to another trace, such as a logs.DecisionTrace, if given.
+    '''
+
+    def __init__(self, trace=None):
+        self.trace = trace
+        self.pending = {}
+        self.decided = []
+
+    def record(self, decision):
+        if self.trace is not None:
+            self.trace.record(decision)
+        if decision['decision'] == 'deferred':
+            return
+
+        future = self.pending.pop(decision['job_id'], None)
+        if future is not None and not future.done():
+            future.set_result({'id': decision['job_id'], 'decision': decision['decision'], 'resource_id': decision['resource_id'],
+                               'start_time': decision['start_time'], 'end_time': decision['end_time']})
+        self.decided.append(decision['job_id'])
+
+
+class SchedulingService:
+    '''
+    Online SOFNET scheduler, holding one architecture in memory and placing jobs as they are submitted
+
+    Jobs wait in a bounded queue until the scheduling loop takes them as a micro-batch: as many as
+    arrive within the batch window of the first one, closed earlier when the batch is full or a job
+    of it would otherwise get within one window of its deadline. Each micro-batch is added to the job
+    queue in order of deadline and Algorithm 1 runs over the queue, as a tick of the event engine
+    would. The clock of the architecture is the time (in ms) since the service started.
+    '''
+
+    def __init__(self, architecture, max_queued_jobs=MAX_QUEUED_JOBS, batch_size=MICRO_BATCH_SIZE, batch_window=MICRO_BATCH_WINDOW, trace=None):
+        self.architecture = architecture
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue = asyncio.Queue(max_queued_jobs)
+        self.recorder = PlacementRecorder(trace)
+        architecture['decision_trace'] = self.recorder
+
+        # Jobs waiting for a decision, indexed like in the event engine
+        self.job_queue = architecture.get('wakeup_index')
+        if self.job_queue is None:
+            self.job_queue = []
+        self.retry_at = None
+        self.trim_at = TRIM_INTERVAL
+
+        self.started_at = time.monotonic()
+        self.stats = {'submitted': 0, 'rejected': 0, 'batches': 0, 'batched_jobs': 0}
+
+    def clock(self):
+        return int(1000 * (time.monotonic() - self.started_at))
+
+    def validate_job(self, job):
+        '''
+        To return why a submitted job cannot be scheduled, or None
+        '''
+        if not isinstance(job, dict):
+            return 'a job must be a JSON object'
+        for key in ('id', 'category', 'instructions', 'deadline', 'eu'):
+            if key not in job:
+                return f'missing {key}'
+        if not isinstance(job['id'], str):
+            return 'id must be a string'
+        for key in ('instructions', 'deadline'):
+            if not isinstance(job[key], int) or isinstance(job[key], bool) or job[key] <= 0:
+                return f'{key} must be a positive integer'
+        if job['category'] not in JOB_CATEGORIES:
+            return f"unknown category {job['category']}"
+        if not isinstance(job['eu'], str) or job['eu'] not in self.architecture['eu_index']:
+            return f"unknown end-user {job['eu']}"
+        if job['id'] in self.recorder.pending:
+            return f"job {job['id']} is already waiting"
+        return None
+
+    async def submit(self, job):
+        '''
+        To queue a job, waiting while the queue is full, and return the future of its placement
+
+        The deadline of a submitted job is relative (in ms) to its submission.
+        '''
+        loop = asyncio.get_running_loop()
+        error = self.validate_job(job)
+        if error is not None:
+            self.stats['rejected'] += 1
+            future = loop.create_future()
+            future.set_result({'id': job.get('id') if isinstance(job, dict) else None, 'decision': 'rejected', 'error': error})
+            return future
+
+        arrival_time = self.clock()
+        job = {'id': job['id'], 'category': job['category'], 'instructions': job['instructions'], 'eu': job['eu'],
+               'arrival_time': arrival_time, 'deadline': arrival_time + job['deadline']}
+        future = loop.create_future()
+        self.recorder.pending[job['id']] = future
+        await self.queue.put((job, future))
+        return future
+
+    async def collect_batch(self, timeout):
+        '''
+        To wait for the next micro-batch, or return an empty one when a retry of the waiting jobs is due first
+        '''
+        try:
+            batch = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+
+        closes_at = self.clock() + self.batch_window
+        while len(batch) < self.batch_size:
+            earliest_deadline = min(job['deadline'] for job, _ in batch)
+            remaining = min(closes_at, earliest_deadline - self.batch_window) - self.clock()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining / 1000))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def schedule_batch(self, batch):
+        '''
+        To add a micro-batch to the job queue and run Algorithm 1 over the queue at the current time
+        '''
+        architecture = self.architecture
+        now = self.clock()
+        architecture['clock'] = now
+        architecture = simulate.free_resource_post_job_completion(architecture, now)
+
+        # Algorithm 1 expects the job queue in increasing order of deadline
+        batch.sort(key=lambda entry: entry[0]['deadline'])
+        sofnet.precompute_job_quantities(architecture, [job for job, _ in batch])
+        for job, _ in batch:
+            self.job_queue.append(job)
+
+        queued_jobs = len(self.job_queue)
+        if queued_jobs:
+            architecture = sofnet.algorithm(architecture, self.job_queue)
+        if isinstance(self.job_queue, list):
+            self.job_queue = [job for job in self.job_queue if job['id'] in self.recorder.pending]
+
+        # The answered jobs are only kept in the metrics
+        for job_id in self.recorder.decided:
+            architecture['executed_jobs'].pop(job_id, None)
+            architecture['dropped_jobs'].pop(job_id, None)
+        self.recorder.decided.clear()
+
+        # Forget the jobs that ended on their resources, so that the memory does not grow with the jobs served
+        if now >= self.trim_at:
+            architecture['resource_logs'].discard_before(now)
+            self.trim_at = now + TRIM_INTERVAL
+
+        # Waiting jobs see a new state after the next tick, or once capacity is freed
+        self.retry_at = None
+        if self.job_queue:
+            if len(self.job_queue) < queued_jobs:
+                self.retry_at = now + 1
+            elif architecture['completions']:
+                self.retry_at = architecture['completions'][0][0] + 1
+
+        if batch:
+            self.stats['batches'] += 1
+            self.stats['batched_jobs'] += len(batch)
+
+    async def run_scheduler(self):
+        # For each micro-batch, or retry of the waiting jobs
+        while True:
+            timeout = None if self.retry_at is None else max(self.retry_at - self.clock(), 0) / 1000
+            batch = await self.collect_batch(timeout)
+            self.schedule_batch(batch)
+
+    def report(self):
+        metrics = self.architecture['metrics']
+        return {'clock': self.clock(),
+                'waiting': len(self.job_queue) + self.queue.qsize(),
+                'scheduled': metrics.scheduled_jobs,
+                'dropped': metrics.dropped_jobs,
+                'SR': metrics.success_ratio(),
+                'mean_batch_size': self.stats['batched_jobs'] / self.stats['batches'] if self.stats['batches'] else 0.0,
+                **self.stats}
+
+    async def handle_connection(self, reader, writer):
+        '''
+        To read one JSON job per line and answer with one JSON placement per line, as each job is decided
+
+        A line {"type": "stats"} is answered with the report of the service instead.
+        '''
+        responses = set()
+
+        async def respond(future):
+            writer.write((json.dumps(await future, default=int) + '\n').encode())
+            await writer.drain()
+
+        try:
+            # For each line of the connection
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as error:
+                    writer.write((json.dumps({'decision': 'rejected', 'error': str(error)}) + '\n').encode())
+                    await writer.drain()
+                    continue
+
+                if isinstance(request, dict) and request.get('type') == 'stats':
+                    writer.write((json.dumps(self.report()) + '\n').encode())
+                    await writer.drain()
+                    continue
+
+                self.stats['submitted'] += 1
+                response = asyncio.create_task(respond(await self.submit(request)))
+                responses.add(response)
+                response.add_done_callback(responses.discard)
+
+            await asyncio.gather(*responses)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        simulation_log.info('Scheduling jobs on %s:%s', host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run_scheduler())
+
+
+def create_service(data_dir='files', SF=0.5, z_score_threshold=0.5, prune_infeasible=False, **service_options):
+    '''
+    To set-up the SOFNET architecture of a network and the service scheduling jobs on it
+    '''
+    C, F, EU, _ = simulate.load_network(data_dir)
+    architecture = simulate.setup_architecture(C, F, EU)
+    architecture['SF'] = SF
+    architecture['z_score_threshold'] = z_score_threshold
+    architecture['prune_infeasible'] = prune_infeasible
+    return SchedulingService(architecture, **service_options)
+
+
+def load_jobs(data_dir='files', count=LOAD_JOBS):
+    '''
+    To take the first jobs of the workload of a network, with deadlines relative to their arrival
+    '''
+    _, _, _, workload = simulate.load_network(data_dir)
+    return [{'id': job['id'], 'category': job['category'], 'instructions': job['instructions'], 'eu': job['eu'],
+             'deadline': job['deadline'] - job['arrival_time']} for job in itertools.islice(simulate.fetch_arrivals(workload), count)]
+
+
+async def generate_load(jobs, host=SERVICE_HOST, port=SERVICE_PORT, rate=LOAD_RATE, connections=LOAD_CONNECTIONS):
+    '''
+    To submit the jobs over several connections at the given rate (in jobs/s), returning the throughput and latencies
+
+    Job i is sent i / rate seconds after the start, or as soon as the service accepts it once it
+    applies backpressure, so the achieved rate shows how many jobs/s the service sustains.
+    '''
+    streams = [await asyncio.open_connection(host, port) for _ in range(connections)]
+    sent_at, answered_at, decisions = {}, {}, {}
+    started_at = time.perf_counter()
+
+    async def send(writer, jobs):
+        # For each job of the connection, at its time
+        for i, job in jobs:
+            delay = started_at + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent_at[job['id']] = time.perf_counter()
+            writer.write((json.dumps(job, default=int) + '\n').encode())
+            await writer.drain()
+
+    async def receive(reader, count):
+        for _ in range(count):
+            response = json.loads(await reader.readline())
+            answered_at[response['id']] = time.perf_counter()
+            decisions[response['id']] = response['decision']
+
+    numbered_jobs = list(enumerate(jobs))
+    tasks = []
+    for k, (reader, writer) in enumerate(streams):
+        connection_jobs = numbered_jobs[k::connections]
+        tasks += [send(writer, connection_jobs), receive(reader, len(connection_jobs))]
+    await asyncio.gather(*tasks)
+    seconds = time.perf_counter() - started_at
+
+    # Read the report of the service
+    reader, writer = streams[0]
+    writer.write(b'{"type": "stats"}\n')
+    report = json.loads(await reader.readline())
+    for _, writer in streams:
+        writer.close()
+
+    latencies = sorted(1000 * (answered_at[job_id] - sent_at[job_id]) for job_id in answered_at)
+    return {'jobs': len(jobs),
+            'seconds': round(seconds, 3),
+            'jobs_per_second': round(len(jobs) / seconds, 1),
+            'decisions': {decision: sum(1 for value in decisions.values() if value == decision) for decision in sorted(set(decisions.values()))},
+            'mean_latency_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'max_latency_ms': round(latencies[-1], 3) if latencies else None,
+            'service': report}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Online SOFNET scheduling service and its load generator')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve = subparsers.add_parser('serve', help='schedule the jobs submitted as JSON lines over TCP')
+    serve.add_argument('--data', default='files', help='folder with the csvs or the binary scenario of the network')
+    serve.add_argument('--host', default=SERVICE_HOST)
+    serve.add_argument('--port', type=int, default=SERVICE_PORT)
+    serve.add_argument('--z-score-threshold', type=float, default=0.5)
+    serve.add_argument('--sf', type=float, default=0.5)
+    serve.add_argument('--prune-infeasible', action='store_true', help='drop the jobs that can no longer meet their deadline')
+    serve.add_argument('--max-queued-jobs', type=int, default=MAX_QUEUED_JOBS)
+    serve.add_argument('--batch-size', type=int, default=MICRO_BATCH_SIZE)
+    serve.add_argument('--batch-window', type=int, default=MICRO_BATCH_WINDOW, help='in ms')
+    serve.add_argument('--trace', help='also write the scheduling decisions to this JSON Lines file')
+
+    load = subparsers.add_parser('load', help='submit the jobs of a workload to a running service')
+    load.add_argument('--data', default='files', help='folder whose workload is replayed')
+    load.add_argument('--host', default=SERVICE_HOST)
+    load.add_argument('--port', type=int, default=SERVICE_PORT)
+    load.add_argument('--jobs', type=int, default=LOAD_JOBS)
+    load.add_argument('--rate', type=float, default=LOAD_RATE, help='target jobs/s')
+    load.add_argument('--connections', type=int, default=LOAD_CONNECTIONS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'load':
+        result = asyncio.run(generate_load(load_jobs(args.data, args.jobs), args.host, args.port, args.rate, args.connections))
+        print(json.dumps(result, indent=2))
+        return 0
+
+    logs.configure_logging(logging.WARNING, subsystems={'simulation': logging.INFO})
+    trace = logs.DecisionTrace(args.trace) if args.trace else None
+    service = create_service(args.data, args.sf, args.z_score_threshold, args.prune_infeasible, max_queued_jobs=args.max_queued_jobs,
+                             batch_size=args.batch_size, batch_window=args.batch_window, trace=trace)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if trace is not None:
+            trace.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
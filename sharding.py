@@ -0,0 +1,194 @@
+import copy
+import heapq
+import multiprocessing
+import logs
+import scenario
+import simulate
+import sofnet
+import utils
+
+simulation_log = logs.get_logger('simulation')
+
+# Architecture, workload and scheduler shared by the shards run in a worker
+SHARD_INPUTS = {}
+
+# Links each scheduler that decides every job on its own places jobs on. SOFNET normalizes the
+# z-scores over the whole queue, so its decisions depend on jobs of every region and it is not sharded
+SHARDED_LINKS = {sofnet.fdc_algorithm: ('fn',),
+                 sofnet.cdc_algorithm: ('cn',)}
+
+
+def find_root(parents, node):
+    while parents[node] != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+
+def find_regions(architecture, links=utils.LINKS):
+    '''
+    To group the end-users into regions that share no resource on the given links, returning the end-user rows of each region
+
+    A job only runs on the resources its end-user is linked to, so two end-users whose resources are
+    not linked through other end-users never compete for a resource. Regions are the connected
+    components of end-users and resources, in order of their first end-user.
+    '''
+    n_fdcs = len(architecture['F'])
+    parents = list(range(n_fdcs + len(architecture['C'])))
+
+    # Number the cdcs after the fdcs
+    columns = [utils.LINK_INDEX[link] for link in links]
+    offsets = [0 if link in ('fn', 'fp') else n_fdcs for link in links]
+    nodes = (architecture['eu_links'][:, columns] + offsets).tolist()
+    for row in nodes:
+        root = find_root(parents, row[0])
+        for node in row[1:]:
+            parents[find_root(parents, node)] = root
+
+    regions = {}
+    for eu_row, row in enumerate(nodes):
+        regions.setdefault(find_root(parents, row[0]), []).append(eu_row)
+    return list(regions.values())
+
+
+def partition_regions(architecture, shards, links=utils.LINKS):
+    '''
+    To pack the regions into at most the given number of shards, returning the end-user rows of each shard
+
+    Regions are never split. The largest region goes first to the shard with the fewest end-users
+    (the lowest shard on ties), so the partition only depends on the topology.
+    '''
+    regions = sorted(find_regions(architecture, links), key=len, reverse=True)
+    members = [[] for _ in range(min(shards, len(regions)))]
+
+    for region in regions:
+        shard = min(range(len(members)), key=lambda i: (len(members[i]), i))
+        members[shard].extend(region)
+
+    return [sorted(eu_rows) for eu_rows in members]
+
+
+def describe_shard(architecture, eu_rows, links=utils.LINKS):
+    '''
+    To return the end-user ids of a shard and the ids of the resources its jobs can run on through the given links
+    '''
+    eu_ids = list(architecture['EU'].keys())
+    F_ids, C_ids = architecture['F'].ids, architecture['C'].ids
+    eu_links = architecture['eu_links'][eu_rows]
+
+    resource_ids = set()
+    for link in links:
+        ids = F_ids if link in ('fn', 'fp') else C_ids
+        resource_ids.update(ids[i] for i in eu_links[:, utils.LINK_INDEX[link]].tolist())
+
+    return {'eu_ids': [eu_ids[i] for i in eu_rows],
+            'resource_ids': [resource_id for resource_id in F_ids + C_ids if resource_id in resource_ids]}
+
+
+def select_arrivals(workload, eu_ids):
+    '''
+    To stream the jobs of the given end-users, in order of arrival time
+    '''
+    if isinstance(workload, scenario.ScenarioWorkload):
+        return scenario.ScenarioWorkload(workload.directory, workload.block_size, eu_ids)
+    eu_ids = set(eu_ids)
+    return (job for job in simulate.fetch_arrivals(workload) if job['eu'] in eu_ids)
+
+
+def initialize_shard_worker(architecture, workload, scheduler, track_utilization):
+    SHARD_INPUTS.update({'architecture': architecture, 'workload': workload, 'scheduler': scheduler, 'track_utilization': track_utilization})
+
+
+def run_shard(shard):
+    '''
+    To simulate the jobs of one shard on a clean copy of the architecture, returning the state of its resources
+    '''
+    architecture = copy.deepcopy(SHARD_INPUTS['architecture'])
+    workload = shard['jobs'] if 'jobs' in shard else select_arrivals(SHARD_INPUTS['workload'], shard['eu_ids'])
+    architecture = simulate.run_event_simulation(workload, architecture, SHARD_INPUTS['scheduler'], SHARD_INPUTS['track_utilization'])
+    return export_shard_state(architecture, shard['resource_ids'])
+
+
+def export_shard_state(architecture, resource_ids):
+    '''
+    To collect what a shard changed: its resources, its jobs, its metrics and its clock
+    '''
+    resource_logs = architecture['resource_logs']
+    resources = {}
+    for resource_id in resource_ids:
+        timeline = resource_logs[resource_id]
+        resources[resource_id] = {'used_capacity': utils.fetch_resource(architecture, resource_id)['used_capacity'],
+                                  'jobs': [(entry['job_id'], entry['start_time'], entry['end_time']) for entry in timeline],
+                                  'utilization': architecture['resource_utilization'].fetch_state(resource_id)}
+
+    return {'resources': resources,
+            'executed_jobs': architecture['executed_jobs'],
+            'dropped_jobs': architecture['dropped_jobs'],
+            'completed_jobs': architecture['completed_jobs'],
+            'completions': architecture['completions'],
+            'metrics': architecture['metrics'],
+            'clock': architecture['clock'],
+            'end_at': architecture['end_at']}
+
+
+def merge_shard_state(architecture, state):
+    '''
+    To apply the state of a shard to the architecture, which no other shard touched on the same resources
+    '''
+    resource_logs = architecture['resource_logs']
+    for resource_id, resource in state['resources'].items():
+        utils.fetch_resource(architecture, resource_id)['used_capacity'] = resource['used_capacity']
+        for job_id, start_time, end_time in resource['jobs']:
+            resource_logs[resource_id].add_job(job_id, start_time, end_time)
+        architecture['resource_utilization'].restore_state(resource_id, resource['utilization'])
+
+    architecture['executed_jobs'].update(state['executed_jobs'])
+    architecture['dropped_jobs'].update(state['dropped_jobs'])
+    architecture['completed_jobs'].extend(state['completed_jobs'])
+    architecture['completions'].extend(state['completions'])
+    heapq.heapify(architecture['completions'])
+    architecture['metrics'].merge(state['metrics'])
+    architecture['clock'] = max(architecture['clock'], state['clock'])
+    architecture['end_at'] = max(architecture['end_at'], state['end_at'])
+    return architecture
+
+
+def run_sharded_event_simulation(workload, architecture, scheduler, shards, track_utilization=True):
+    '''
+    To simulate the workload with run_event_simulation in one process per region shard, merging the shards in order
+
+    Only the schedulers of SHARDED_LINKS, which decide every job on its own, can be sharded. Their
+    regions share no resource on the links they place jobs on, so every job sees the same resource
+    state and is scheduled as in a single run.
+    '''
+    links = SHARDED_LINKS.get(scheduler)
+    if links is None:
+        raise ValueError('only the fdc and cdc baselines can be sharded: SOFNET normalizes the z-scores over the whole queue, run it without shards')
+    if architecture.get('decision_trace') is not None:
+        raise ValueError('a decision trace is written by a single process, run without shards to record one')
+
+    partition = partition_regions(architecture, shards, links)
+    if len(partition) == 1:
+        return simulate.run_event_simulation(workload, architecture, scheduler, track_utilization)
+
+    tasks = [describe_shard(architecture, eu_rows, links) for eu_rows in partition]
+    simulation_log.info('%s shards of %s end-users', len(tasks), [len(eu_rows) for eu_rows in partition])
+
+    # Only csvs and binary scenarios can be streamed by each shard; other workloads are split here
+    if not isinstance(workload, (str, scenario.ScenarioWorkload)):
+        shard_index = {eu_id: i for i, task in enumerate(tasks) for eu_id in task['eu_ids']}
+        for task in tasks:
+            task['jobs'] = []
+        for job in simulate.fetch_arrivals(workload):
+            tasks[shard_index[job['eu']]]['jobs'].append(job)
+        workload = None
+
+    initargs = (architecture, workload, scheduler, track_utilization)
+    with multiprocessing.Pool(len(tasks), initializer=initialize_shard_worker, initargs=initargs) as pool:
+        states = pool.map(run_shard, tasks)
+
+    # For each shard, in order, so that the merged architecture does not depend on which finished first
+    for state in states:
+        architecture = merge_shard_state(architecture, state)
+
+    return architecture
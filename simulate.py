@@ -1,8 +1,32 @@
+import copy
+import heapq
+import itertools
+import logging
 import math
-import time
+import multiprocessing
+import os
+import sys
 import sofnet
-import pandas as pd
+import checkpoint
+import logs
+import scenario
+from metrics import PerformanceMetrics, UtilizationTracker
+import numpy as np
 import utils
+from resources import ResourceTable
+from timelines import ResourceLogs
+from wakeup import WakeupIndex
+
+simulation_log = logs.get_logger('simulation')
+
+# Rows of the workload csv read at once when streaming it
+WORKLOAD_CHUNK_SIZE = 100000
+
+# Simulated time (in ms) between two progress reports of the running metrics
+PROGRESS_LOG_INTERVAL = 10000
+
+# Arriving jobs whose static quantities are computed at once
+ARRIVAL_BLOCK_SIZE = 4096
 
 
 def register_resources(resources):
@@ -38,37 +62,12 @@ def compute_quantities(workload):
 
 
 def initialize_resource_logs(C, F):
-    resource_logs = {}
-
-    for cdc_id in C.keys():
-        resource_logs[cdc_id] = []
-
-    for fdc_id in F.keys():
-        resource_logs[fdc_id] = []
-    
+    resource_logs = ResourceLogs(list(C.keys()) + list(F.keys()))
     return resource_logs
 
 
 def initialize_resource_utilization(C, F):
-    resource_utilization = {}
-
-    for cdc_id in C.keys():
-        resource_utilization[cdc_id] = 0.0
-
-    for fdc_id in F.keys():
-        resource_utilization[fdc_id] = 0.0
-    
-    return resource_utilization
-
-
-def update_resource_utilization(architecture):
-    C, F, resource_utilization = architecture['C'], architecture['F'], architecture['resource_utilization']
-    for resource_id in resource_utilization.keys():
-        if 'fdc' in resource_id:
-            resource_utilization[resource_id] += 100 * F[resource_id]['used_capacity'] / F[resource_id]['total_capacity']
-        else:
-            resource_utilization[resource_id] += 100 * C[resource_id]['used_capacity'] / C[resource_id]['total_capacity']
-
+    resource_utilization = UtilizationTracker(list(C.keys()) + list(F.keys()))
     return resource_utilization
 
 
@@ -98,54 +97,111 @@ def display_resource_logs(resource_logs):
 
 
 def setup_architecture(C, F, EU):
+    # Store the resources as struct-of-arrays tables, leaving the given dicts untouched
+    C, F = ResourceTable(C), ResourceTable(F)
+
     # Map the native and public resources
     F = utils.map_fog_to_cloud(F, C)
     EU = utils.map_end_user_to_fog(EU, F)
 
+    # Precompute the resources and propagation delays of each end-user
+    eu_links = utils.build_link_table(EU, F, C)
+    eu_index, propagation_delays = utils.build_propagation_delay_table(EU, F, C, eu_links)
+
     # Define the network architecture
     architecture = {'C': C,
                     'F': F,
                     'EU': EU,
+                    'eu_index': eu_index,
+                    'eu_links': eu_links,
+                    'propagation_delays': propagation_delays,
                     'resource_logs': initialize_resource_logs(C, F),
                     'resource_utilization': initialize_resource_utilization(C, F),
                     'executed_jobs': {},
+                    'dropped_jobs': {},
                     'completed_jobs': [],
+                    'completions': [],
+                    'constraint_batch': None,
+                    'decision_trace': None,
+                    'metrics': PerformanceMetrics(),
+                    'wakeup_index': WakeupIndex(),
+                    'prune_infeasible': False,
+                    'backfill_gaps': False,
+                    'clock': 0,
                     'end_at': -1}
     
     return architecture
 
 
 def setup_fdc_architecture(C, F, EU):
+    # Store the resources as struct-of-arrays tables, leaving the given dicts untouched
+    C, F = ResourceTable(C), ResourceTable(F)
+
     # Map the native and public resources
     F = utils.map_fog_to_cloud(F, C)
     EU = utils.map_end_user_to_fog(EU, F)
 
+    # Precompute the resources and propagation delays of each end-user
+    eu_links = utils.build_link_table(EU, F, C)
+    eu_index, propagation_delays = utils.build_propagation_delay_table(EU, F, C, eu_links)
+
     # Define the network architecture
     architecture = {'C': C,
                     'F': F,
                     'EU': EU,
+                    'eu_index': eu_index,
+                    'eu_links': eu_links,
+                    'propagation_delays': propagation_delays,
                     'resource_logs': initialize_resource_logs(C, F),
                     'resource_utilization': initialize_resource_utilization(C, F),
                     'executed_jobs': {},
+                    'dropped_jobs': {},
                     'completed_jobs': [],
+                    'completions': [],
+                    'constraint_batch': None,
+                    'decision_trace': None,
+                    'metrics': PerformanceMetrics(),
+                    'wakeup_index': None,
+                    'prune_infeasible': False,
+                    'backfill_gaps': False,
+                    'clock': 0,
                     'end_at': -1}
     
     return architecture
 
 
 def setup_cdc_architecture(C, F, EU):
+    # Store the resources as struct-of-arrays tables, leaving the given dicts untouched
+    C, F = ResourceTable(C), ResourceTable(F)
+
     # Map the native and public resources
     F = utils.map_fog_to_cloud(F, C)
     EU = utils.map_end_user_to_fog(EU, F)
 
+    # Precompute the resources and propagation delays of each end-user
+    eu_links = utils.build_link_table(EU, F, C)
+    eu_index, propagation_delays = utils.build_propagation_delay_table(EU, F, C, eu_links)
+
     # Define the network architecture
     architecture = {'C': C,
                     'F': F,
                     'EU': EU,
+                    'eu_index': eu_index,
+                    'eu_links': eu_links,
+                    'propagation_delays': propagation_delays,
                     'resource_logs': initialize_resource_logs(C, F),
                     'resource_utilization': initialize_resource_utilization(C, F),
                     'executed_jobs': {},
+                    'dropped_jobs': {},
                     'completed_jobs': [],
+                    'completions': [],
+                    'constraint_batch': None,
+                    'decision_trace': None,
+                    'metrics': PerformanceMetrics(),
+                    'wakeup_index': None,
+                    'prune_infeasible': False,
+                    'backfill_gaps': False,
+                    'clock': 0,
                     'end_at': -1}
     
     return architecture
@@ -159,128 +215,268 @@ def display_final_job_resource_pair(executed_jobs):
     return
 
 
-def free_resource_post_job_completion(architecture, all_jobs, counter):
+def free_resource_post_job_completion(architecture, counter):
     '''
     To free resource storage post job completion
     '''
-    # For each job in execution
-    for job_id, job_info in architecture['executed_jobs'].items():
+    completions = architecture['completions']
+
+    # For each job completed by now
+    while completions and completions[0][0] <= counter:
 
-        # Check for completion
-        if job_info['end_time'] == counter:
+        # Free the resource
+        _, _, job_resource_id, job_size = heapq.heappop(completions)
+        resource = utils.fetch_resource(architecture, job_resource_id)
 
-            # Free the resource
-            job_resource_id = job_info['resource']
-            job_size = 64 * all_jobs[job_id]['instructions']
-            resource = F[job_resource_id] if 'f' in job_resource_id else C[job_resource_id]
-            resource['used_capacity'] -= job_size
+        # The capacity is in use until the end of the tick
+        sofnet.change_used_capacity(architecture, job_resource_id, resource, -job_size, counter + 1)
 
     return architecture
 
 
-def run_simulation(workload, architecture):
-    # Represents real-time clock
-    counter = 0
-    job_queue = []
-    remaining_jobs = workload.copy()
-    all_jobs = register_resources(workload.to_dict('records'))
+def register_arrivals(all_jobs):
+    '''
+    To order the jobs by arrival time, keeping the workload order for jobs arriving together
+    '''
+    return sorted(all_jobs.values(), key=lambda job: job['arrival_time'])
 
-    # Until all jobs are executed
-    while True:
-    
-        # Until all new jobs are added to job queue
-        while len(remaining_jobs):
-            top_job = remaining_jobs.iloc[0]
 
-            if top_job['arrival_time'] == counter: 
-                job_queue.append(all_jobs[top_job['id']])
-                remaining_jobs = remaining_jobs.iloc[1:, :]
-            else: break
+def release_jobs_arriving_together(frames):
+    '''
+    To release the jobs sharing one arrival time, sorted by deadline
+    '''
+    import pandas as pd
 
-        # Schedule the jobs in the job queue
-        architecture = sofnet.algorithm(architecture, job_queue)
+    jobs = pd.concat(frames) if len(frames) > 1 else frames[0]
+    return jobs.sort_values(by='deadline', kind='stable').to_dict('records')
 
-        job_queue = [job for job in job_queue if job['id'] not in architecture['executed_jobs'].keys()]
 
-        architecture['resource_utilization'] = update_resource_utilization(architecture)
+def read_workload(path, chunksize=WORKLOAD_CHUNK_SIZE):
+    '''
+    To stream the jobs of a workload csv in order of arrival time, reading it one chunk at a time
 
-        # Free resource storage post job completion
-        architecture = free_resource_post_job_completion(architecture, all_jobs, counter)
+    The csv must list the jobs in non-decreasing arrival time. Jobs arriving together are released
+    together, sorted by deadline, so the job queue receives them in the same order as from a
+    workload sorted by deadline and arrival time. Only the jobs of the latest arrival time are held
+    back between chunks, since more of them may follow in the next one.
+    '''
+    import pandas as pd
 
-        # if not counter % 1000:
-        #     print('counter:', counter)
-        #     print("architecture['end_at']:", architecture['end_at'])
-        #     print('len(remaining_jobs):', len(remaining_jobs))
+    held, held_arrival_time = [], None
 
-        # Check for end of simulation
-        #0<=15
-        if counter <= architecture['end_at'] or len(remaining_jobs): counter += 1
-        else: break
-    
-    SR = utils.calculate_success_ratio(all_jobs, architecture['executed_jobs'])
-    print(f'Success Ratio: {SR}')
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk = chunk.sort_values(by=['arrival_time', 'deadline'])
+        arrival_times = chunk['arrival_time'].to_numpy()
 
-    SC = utils.calculate_system_cost(architecture)
-    print(f'System Cost: {SC}')
+        if held and arrival_times[0] < held_arrival_time:
+            raise ValueError(f'{path} is not sorted by arrival time: a job arriving at {arrival_times[0]} follows jobs arriving at {held_arrival_time}')
 
-    RU = utils.calculate_resource_utilization(architecture)
-    print(f'Resource Utilization: {RU}')
+        # Jobs arriving with the held ones
+        n_held = int(np.searchsorted(arrival_times, held_arrival_time, side='right')) if held else 0
+        if n_held:
+            held.append(chunk.iloc[:n_held])
+        if n_held == len(chunk):
+            continue
 
-    # display_final_job_resource_pair(architecture['executed_jobs'])
-    # display_resource_logs(architecture['resource_logs'])
+        # Later jobs complete the held ones
+        if held:
+            yield from release_jobs_arriving_together(held)
 
-    performance_ratio =  {'SR': SR,
-                        'SC': SC,
-                        'RU': RU}
+        chunk, arrival_times = chunk.iloc[n_held:], arrival_times[n_held:]
+        n_complete = int(np.searchsorted(arrival_times, arrival_times[-1], side='left'))
+        yield from chunk.iloc[:n_complete].to_dict('records')
+        held, held_arrival_time = [chunk.iloc[n_complete:]], arrival_times[-1]
 
-    return performance_ratio
+    if held:
+        yield from release_jobs_arriving_together(held)
+
+
+def fetch_arrivals(workload):
+    '''
+    To iterate over the jobs of a workload in order of arrival time
+
+    The workload is either a csv path (streamed in chunks), a DataFrame sorted by deadline and
+    arrival time, or an iterable of job dicts already in order of arrival time (such as the
+    scenario.ScenarioWorkload of a binary scenario).
+    '''
+    if isinstance(workload, str):
+        return read_workload(workload)
+    # A DataFrame can only be given once pandas is loaded
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(workload, pd.DataFrame):
+        return iter(register_arrivals(register_resources(workload.to_dict('records'))))
+    return iter(workload)
+
+
+def precompute_arrivals(architecture, arrivals, block_size=ARRIVAL_BLOCK_SIZE):
+    '''
+    To compute the runtimes, communication delays and sizes of the arriving jobs once, a block at a time
+
+    The quantities depend on the architecture, so they are computed again for every simulation
+    even when the jobs already carry them from another one.
+    '''
+    while block := list(itertools.islice(arrivals, block_size)):
+        yield from sofnet.precompute_job_quantities(architecture, block)
+
+
+def load_network(data_dir='files'):
+    '''
+    To load the resources, end-users and workload of a folder: its binary scenario (memory-mapped) when
+    it has one, or is one, and its csvs otherwise
+    '''
+    for directory in (data_dir, os.path.join(data_dir, 'scenario')):
+        if os.path.exists(os.path.join(directory, 'scenario.json')):
+            return scenario.load_scenario(directory)
 
+    import pandas as pd
+
+    # Import the files
+    C = register_resources(pd.read_csv(os.path.join(data_dir, 'CDCs.csv')).to_dict('records'))
+    F = register_resources(pd.read_csv(os.path.join(data_dir, 'FDCs.csv')).to_dict('records'))
+    EU = register_resources(pd.read_csv(os.path.join(data_dir, 'EUs.csv')).to_dict('records'))
+
+    # The workload is streamed by each simulation in order of arrival time
+    workload = os.path.join(data_dir, 'workload.csv')
+    return C, F, EU, workload
+
+
+def run_event_simulation(workload, architecture, scheduler, track_utilization=True, checkpointer=None, engine_state=None):
+    '''
+    To simulate the workload on the architecture by jumping from one event to the next
+
+    A tick only does work when a job arrives, a job completes or the previous pass scheduled
+    something while jobs are still waiting (retry). In between, the scheduler would see the same
+    queue and the same resource state and would make the same decisions, so those ticks are
+    skipped. The resource utilization only changes with allocations and frees, so it is
+    integrated there and needs no work per tick.
+
+    Given a checkpoint.Checkpointer, the architecture and the state of the engine are saved between
+    two ticks when a snapshot is due. Given that engine state, the simulation resumes where it was
+    saved, skipping the jobs of the workload that had already arrived.
+    '''
+    if engine_state is None:
+        engine_state = {'counter': 0, 'arrived_jobs': 0, 'job_queue': [], 'retry_at': None, 'next_report': PROGRESS_LOG_INTERVAL}
+    arrived_jobs = engine_state['arrived_jobs']
+    arrivals = precompute_arrivals(architecture, itertools.islice(fetch_arrivals(workload), arrived_jobs, None))
+    next_job = next(arrivals, None)
+    executed_jobs, dropped_jobs = architecture['executed_jobs'], architecture['dropped_jobs']
+    completions = architecture['completions']
+    architecture['resource_utilization'].is_tracking = track_utilization
+
+    # Jobs waiting to be scheduled, indexed by what can unblock them when the architecture has a wake-up index
+    job_queue = architecture.get('wakeup_index')
+    if job_queue is None:
+        job_queue = engine_state['job_queue']
+    retry_at = engine_state['retry_at']
+    next_report = engine_state['next_report']
 
-def run_fdc_simulation(workload, architecture):
     # Represents real-time clock
-    counter = 0
-    job_queue = []
-    remaining_jobs = workload.copy()
-    all_jobs = register_resources(workload.to_dict('records'))
+    counter = engine_state['counter']
+    if checkpointer is not None:
+        checkpointer.start(counter)
 
     # Until all jobs are executed
     while True:
-    
-        # Until all new jobs are added to job queue
-        while len(remaining_jobs):
-            top_job = remaining_jobs.iloc[0]
+        architecture['clock'] = counter
+        is_pass_due = counter == retry_at
 
-            if top_job['arrival_time'] == counter: 
-                job_queue.append(all_jobs[top_job['id']])
-                remaining_jobs = remaining_jobs.iloc[1:, :]
-            else: break
+        # Add the jobs arriving now to the job queue
+        while next_job is not None and next_job['arrival_time'] <= counter:
+            job_queue.append(next_job)
+            arrived_jobs += 1
+            next_job = next(arrivals, None)
+            is_pass_due = True
 
         # Schedule the jobs in the job queue
-        architecture = sofnet.fdc_algorithm(architecture, job_queue)
+        if is_pass_due and job_queue:
+            queued_jobs = len(job_queue)
+            architecture = scheduler(architecture, job_queue)
 
-        job_queue = [job for job in job_queue if job['id'] not in architecture['executed_jobs'].keys()]
+            # The wake-up index drops the jobs as they are scheduled or dropped
+            if isinstance(job_queue, list):
+                job_queue = [job for job in job_queue if job['id'] not in executed_jobs and job['id'] not in dropped_jobs]
+
+            # Waiting jobs see a new state on the next tick
+            if len(job_queue) < queued_jobs and job_queue:
+                retry_at = counter + 1
 
         # Free resource storage post job completion
-        architecture = free_resource_post_job_completion(architecture, all_jobs, counter)
+        if completions and completions[0][0] <= counter:
+            architecture = free_resource_post_job_completion(architecture, counter)
+
+            # Waiting jobs see the released capacity on the next tick
+            if job_queue:
+                retry_at = counter + 1
 
-        # if not counter % 1000:
-        #     print('counter:', counter)
-        #     print("architecture['end_at']:", architecture['end_at'])
-        #     print('len(remaining_jobs):', len(remaining_jobs))
+        # Report the running metrics
+        if counter >= next_report:
+            metrics = architecture['metrics']
+            simulation_log.info('@%s ms | %s jobs scheduled, %s waiting | SR: %s | SC: %s', counter, metrics.scheduled_jobs,
+                                len(job_queue), metrics.success_ratio(), metrics.system_cost(architecture))
+            next_report = counter + PROGRESS_LOG_INTERVAL
 
         # Check for end of simulation
-        #0<=15
-        if counter <= architecture['end_at'] or len(remaining_jobs): counter += 1
-        else: break
-    
-    SR = utils.calculate_success_ratio(all_jobs, architecture['executed_jobs'])
-    print(f'Success Ratio: {SR}')
+        if counter > architecture['end_at'] and next_job is None:
+            break
+
+        # Jump to the next event, or to the tick at which the simulation ends
+        next_events = [architecture['end_at'] + 1]
+        if completions: next_events.append(completions[0][0])
+        if next_job is not None: next_events.append(next_job['arrival_time'])
+        if retry_at is not None and retry_at > counter: next_events.append(retry_at)
+        counter = max(counter + 1, min(next_events))
+
+        # Save the state the next tick starts from
+        if checkpointer is not None and checkpointer.is_due(counter):
+            checkpointer.save(architecture, {'counter': counter,
+                                             'arrived_jobs': arrived_jobs,
+                                             'job_queue': job_queue if isinstance(job_queue, list) else [],
+                                             'retry_at': retry_at,
+                                             'next_report': next_report,
+                                             'scheduler': scheduler,
+                                             'track_utilization': track_utilization})
+
+    return architecture
+
+
+def resume_simulation(path, workload, checkpointer=None):
+    '''
+    To continue a simulation from a snapshot of it, on the same workload, returning its performance ratio
+
+    The architecture, including its SF and z-score threshold, and the scheduler are the ones saved in
+    the snapshot. The results are the same as those of the run that was never interrupted.
+    '''
+    architecture, engine_state = checkpoint.read_snapshot(path)
+    simulation_log.info('Resuming from %s @%s ms, %s jobs arrived', path, engine_state['counter'], engine_state['arrived_jobs'])
+
+    architecture = run_event_simulation(workload, architecture, engine_state['scheduler'], engine_state['track_utilization'],
+                                        checkpointer, engine_state)
+    return architecture['metrics'].performance_ratio(architecture)
 
-    SC = utils.calculate_system_cost(architecture)
-    print(f'System Cost: {SC}')
+
+def run_strategy_simulation(workload, architecture, scheduler, shards=1, track_utilization=True, checkpointer=None):
+    '''
+    To run the event simulation in this process, or in one process per region shard for the fdc and cdc baselines (see sharding.py)
+    '''
+    if shards > 1:
+        if checkpointer is not None:
+            raise ValueError('sharded simulations cannot be checkpointed')
+        import sharding
+        return sharding.run_sharded_event_simulation(workload, architecture, scheduler, shards, track_utilization)
+    return run_event_simulation(workload, architecture, scheduler, track_utilization, checkpointer)
+
+
+def run_simulation(workload, architecture, checkpointer=None):
+    architecture = run_strategy_simulation(workload, architecture, sofnet.algorithm, checkpointer=checkpointer)
+
+    SR = architecture['metrics'].success_ratio()
+    simulation_log.info('Success Ratio: %s', SR)
+
+    SC = architecture['metrics'].system_cost(architecture)
+    simulation_log.info('System Cost: %s', SC)
 
     RU = utils.calculate_resource_utilization(architecture)
-    print(f'Resource Utilization: {RU}')
+    simulation_log.info('Resource Utilization: %s', RU)
 
     # display_final_job_resource_pair(architecture['executed_jobs'])
     # display_resource_logs(architecture['resource_logs'])
@@ -292,53 +488,39 @@ def run_fdc_simulation(workload, architecture):
     return performance_ratio
 
 
-def run_cdc_simulation(workload, architecture):
-    # Represents real-time clock
-    counter = 0
-    job_queue = []
-    remaining_jobs = workload.copy()
-    all_jobs = register_resources(workload.to_dict('records'))
+def run_fdc_simulation(workload, architecture, shards=1, checkpointer=None):
+    architecture = run_strategy_simulation(workload, architecture, sofnet.fdc_algorithm, shards, track_utilization=False, checkpointer=checkpointer)
 
-    # Until all jobs are executed
-    while True:
-    
-        # Until all new jobs are added to job queue
-        while len(remaining_jobs):
-            top_job = remaining_jobs.iloc[0]
+    SR = architecture['metrics'].success_ratio()
+    simulation_log.info('Success Ratio: %s', SR)
 
-            if top_job['arrival_time'] == counter: 
-                job_queue.append(all_jobs[top_job['id']])
-                remaining_jobs = remaining_jobs.iloc[1:, :]
-            else: break
+    SC = architecture['metrics'].system_cost(architecture)
+    simulation_log.info('System Cost: %s', SC)
 
-        # Schedule the jobs in the job queue
-        architecture = sofnet.cdc_algorithm(architecture, job_queue)
+    RU = utils.calculate_resource_utilization(architecture)
+    simulation_log.info('Resource Utilization: %s', RU)
 
-        job_queue = [job for job in job_queue if job['id'] not in architecture['executed_jobs'].keys()]
+    # display_final_job_resource_pair(architecture['executed_jobs'])
+    # display_resource_logs(architecture['resource_logs'])
 
-        architecture['resource_utilization'] = update_resource_utilization(architecture)
+    performance_ratio =  {'SR': SR,
+                        'SC': SC,
+                        'RU': RU}
 
-        # Free resource storage post job completion
-        architecture = free_resource_post_job_completion(architecture, all_jobs, counter)
+    return performance_ratio
 
-        # if not counter % 1000:
-        #     print('counter:', counter)
-        #     print("architecture['end_at']:", architecture['end_at'])
-        #     print('len(remaining_jobs):', len(remaining_jobs))
 
-        # Check for end of simulation
-        #0<=15
-        if counter <= architecture['end_at'] or len(remaining_jobs): counter += 1
-        else: break
-    
-    SR = utils.calculate_success_ratio(all_jobs, architecture['executed_jobs'])
-    print(f'Success Ratio: {SR}')
+def run_cdc_simulation(workload, architecture, shards=1, checkpointer=None):
+    architecture = run_strategy_simulation(workload, architecture, sofnet.cdc_algorithm, shards, checkpointer=checkpointer)
+
+    SR = architecture['metrics'].success_ratio()
+    simulation_log.info('Success Ratio: %s', SR)
 
-    SC = utils.calculate_system_cost(architecture)
-    print(f'System Cost: {SC}')
+    SC = architecture['metrics'].system_cost(architecture)
+    simulation_log.info('System Cost: %s', SC)
 
     RU = utils.calculate_resource_utilization(architecture)
-    print(f'Resource Utilization: {RU}')
+    simulation_log.info('Resource Utilization: %s', RU)
 
     # display_final_job_resource_pair(architecture['executed_jobs'])
     # display_resource_logs(architecture['resource_logs'])
@@ -380,111 +562,165 @@ def end_test(C, F):
 #     return performance_ratio
 
 
-# Import the files
-C = register_resources(pd.read_csv('files/CDCs.csv').to_dict('records'))
-F = register_resources(pd.read_csv('files/FDCs.csv').to_dict('records'))
-EU = register_resources(pd.read_csv('files/EUs.csv').to_dict('records'))
+# Set-up and run functions of each scheduling strategy
+STRATEGIES = {'sofnet': (setup_architecture, run_simulation),
+              'fdc': (setup_fdc_architecture, run_fdc_simulation),
+              'cdc': (setup_cdc_architecture, run_cdc_simulation)}
 
-# Sort the workload based on deadline and arrival time
-workload = pd.read_csv('files/workload.csv').sort_values(by=['deadline', 'arrival_time'])
+# Topology and workload shared by the runs of a sweep worker
+SWEEP_INPUTS = {}
 
-z_score_thresholds = [0.1 * i for i in range(11)]
-SF_thresholds = [0.1 * i for i in range(11)]
 
-X = [round(i/10, 1) for i in range(11)]
-SR_Y = []
-SC_Y = []
-RU_Y = []
+def build_sweep_grid(z_score_thresholds=(0.5,), SF_thresholds=(0.5,), strategies=('sofnet',)):
+    '''
+    To list every (strategy, z-score threshold, SF) point of a parameter sweep
+    '''
+    grid = []
+    for strategy in strategies:
+        for z_score_threshold in z_score_thresholds:
+            for SF in SF_thresholds:
+                grid.append({'strategy': strategy, 'z_score_threshold': z_score_threshold, 'SF': SF})
+    return grid
 
-for i in range(11):
-    architecture = setup_architecture(C, F, EU)
+
+def initialize_sweep_worker(C, F, EU, workload):
+    SWEEP_INPUTS.update({'C': C, 'F': F, 'EU': EU, 'workload': workload})
+
+
+def run_sweep_point(point):
+    '''
+    To run one point of the sweep on its own architecture, built from a clean copy of the topology
+    '''
+    setup, run = STRATEGIES[point['strategy']]
+    C, F, EU = copy.deepcopy(SWEEP_INPUTS['C']), copy.deepcopy(SWEEP_INPUTS['F']), copy.deepcopy(SWEEP_INPUTS['EU'])
+
+    architecture = setup(C, F, EU)
+    architecture['SF'] = point['SF']
+    architecture['z_score_threshold'] = point['z_score_threshold']
+    performance_ratio = run(SWEEP_INPUTS['workload'], architecture)
+    return point, performance_ratio
+
+
+def run_sweep(C, F, EU, workload, grid, processes=None):
+    '''
+    To run the points of the grid in a process pool, yielding (point, performance ratio) as each run finishes
+    '''
+    if processes == 1:
+        initialize_sweep_worker(C, F, EU, workload)
+        for point in grid:
+            yield run_sweep_point(point)
+        return
+
+    with multiprocessing.Pool(processes, initializer=initialize_sweep_worker, initargs=(C, F, EU, workload)) as pool:
+        for point, performance_ratio in pool.imap_unordered(run_sweep_point, grid):
+            yield point, performance_ratio
+
+
+def main():
+    logs.configure_logging(logging.INFO)
+
+    C, F, EU, workload = load_network()
+
+    z_score_thresholds = [0.1 * i for i in range(11)]
+    SF_thresholds = [0.1 * i for i in range(11)]
+
+    X = [round(i/10, 1) for i in range(11)]
+    SR_Y = []
+    SC_Y = []
+    RU_Y = []
+
+    # Run the thresholds in parallel, each on a clean copy of the topology
+    grid = build_sweep_grid(z_score_thresholds=X, SF_thresholds=[0.5])
+    results = {point['z_score_threshold']: performance_ratio for point, performance_ratio in run_sweep(C, F, EU, workload, grid)}
+
+    for z_score_threshold in X:
+        performance_ratio = results[z_score_threshold]
+        SR_Y.append(performance_ratio['SR'])
+        SC_Y.append(performance_ratio['SC'] / 1000)
+        RU_Y.append(performance_ratio['RU'])
+
+    print(f'Z-Score Thresholds: {X}')
+    print(f'SR Values: {SR_Y}')
+    print(f'SC Values: {SC_Y}')
+    print(f'RU Values: {RU_Y}')
+
+    count = 0
+    utils.plot(X, SR_Y, 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
+    count += 1
+    utils.plot(X, SC_Y, 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count)
+    count += 1
+    utils.plot(X, RU_Y, 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count)
+    count += 1
+
+
+    print('For scheduling only on FDC...')
+
+    SR_Y = []
+    SC_Y = []
+    RU_Y = []
+    architecture = setup_fdc_architecture(C, F, EU)
+    architecture['SF'] = 0.5
+    architecture['z_score_threshold'] = 0.5
+    performance_ratio = run_fdc_simulation(workload, architecture)
+    for i in range(11):
+        SR_Y.append(performance_ratio['SR'])
+        SC_Y.append(performance_ratio['SC'] / 1000)
+        RU_Y.append(performance_ratio['RU'])
+
+    print(f'Z-Score Thresholds: {X}')
+    print(f'SR Values: {SR_Y}')
+    print(f'SC Values: {SC_Y}')
+    print(f'RU Values: {RU_Y}')
+
+
+    utils.plot(X, SR_Y, 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
+    count += 1
+    utils.plot(X, SC_Y, 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count)
+    count += 1
+    utils.plot(X, RU_Y, 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count)
+    count += 1
+
+    print('For scheduling only on CDC...')
+
+    SR_Y = []
+    SC_Y = []
+    RU_Y = []
+    architecture = setup_cdc_architecture(C, F, EU)
     architecture['SF'] = 0.5
-    architecture['z_score_threshold'] = round(i / 10, 1)
-    performance_ratio = run_simulation(workload, architecture)
-    SR_Y.append(performance_ratio['SR'])
-    SC_Y.append(performance_ratio['SC'] / 1000)
-    RU_Y.append(performance_ratio['RU'])
-
-print(f'Z-Score Thresholds: {X}')
-print(f'SR Values: {SR_Y}')
-print(f'SC Values: {SC_Y}')
-print(f'RU Values: {RU_Y}')
-
-count = 0
-utils.plot(X, SR_Y, 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
-count += 1
-utils.plot(X, SC_Y, 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count)
-count += 1
-utils.plot(X, RU_Y, 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count)
-count += 1
-
-
-print('For scheduling only on FDC...')
-
-SR_Y = []
-SC_Y = []
-RU_Y = []
-architecture = setup_fdc_architecture(C, F, EU)
-architecture['SF'] = 0.5
-architecture['z_score_threshold'] = 0.5
-performance_ratio = run_fdc_simulation(workload, architecture)
-for i in range(11):
-    SR_Y.append(performance_ratio['SR'])
-    SC_Y.append(performance_ratio['SC'] / 1000)
-    RU_Y.append(performance_ratio['RU'])
-
-print(f'Z-Score Thresholds: {X}')
-print(f'SR Values: {SR_Y}')
-print(f'SC Values: {SC_Y}')
-print(f'RU Values: {RU_Y}')
-
-
-print(time.sleep(20))
-
-utils.plot(X, SR_Y, 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
-count += 1
-utils.plot(X, SC_Y, 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count)
-count += 1
-utils.plot(X, RU_Y, 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count)
-count += 1
-
-print('For scheduling only on CDC...')
-
-SR_Y = []
-SC_Y = []
-RU_Y = []
-architecture = setup_cdc_architecture(C, F, EU)
-architecture['SF'] = 0.5
-architecture['z_score_threshold'] = 0.5
-performance_ratio = run_cdc_simulation(workload, architecture)
-for i in range(11):
-    SR_Y.append(performance_ratio['SR'])
-    SC_Y.append(performance_ratio['SC'] / 1000)
-    RU_Y.append(performance_ratio['RU'])
-
-print(f'Z-Score Thresholds: {X}')
-print(f'SR Values: {SR_Y}')
-print(f'SC Values: {SC_Y}')
-print(f'RU Values: {RU_Y}')
-
-utils.plot(X, SR_Y, 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
-count += 1
-utils.plot(X, SC_Y, 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count)
-count += 1
-utils.plot(X, RU_Y, 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count)
-
-# architecture['SF'] = 0.5
-# run_simulation(workload, architecture)
-
-# trigger_simulations(workload, SF_thresholds=SF_thresholds)
-
-# display_resource_logs(architecture['resource_logs'])
-# display_cdc_data(EU)
-# display_cdc_data(F)
-# display_cdc_data(C)
-# display_native_and_public_fdc(EU)
-# display_native_and_public_cdc(F)
-
-# run_simulation(C, F, EU, workload, SF=0.5)
-
-# end_test(C, F)
\ No newline at end of file
+    architecture['z_score_threshold'] = 0.5
+    performance_ratio = run_cdc_simulation(workload, architecture)
+    for i in range(11):
+        SR_Y.append(performance_ratio['SR'])
+        SC_Y.append(performance_ratio['SC'] / 1000)
+        RU_Y.append(performance_ratio['RU'])
+
+    print(f'Z-Score Thresholds: {X}')
+    print(f'SR Values: {SR_Y}')
+    print(f'SC Values: {SC_Y}')
+    print(f'RU Values: {RU_Y}')
+
+    utils.plot(X, SR_Y, 'Z-Score Threshold', 'Success Ratio (SR)', 'SR vs Z-Score Threshold', count)
+    count += 1
+    utils.plot(X, SC_Y, 'Z-Score Threshold', 'System Cost (SC) (in s)', 'SC vs Z-Score Threshold', count)
+    count += 1
+    utils.plot(X, RU_Y, 'Z-Score Threshold', 'Resource Utilization (in %)', 'RU vs Z-Score Threshold', count)
+
+    # architecture['SF'] = 0.5
+    # run_simulation(workload, architecture)
+
+    # trigger_simulations(workload, SF_thresholds=SF_thresholds)
+
+    # display_resource_logs(architecture['resource_logs'])
+    # display_cdc_data(EU)
+    # display_cdc_data(F)
+    # display_cdc_data(C)
+    # display_native_and_public_fdc(EU)
+    # display_native_and_public_cdc(F)
+
+    # run_simulation(C, F, EU, workload, SF=0.5)
+
+    # end_test(C, F)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,134 +1,352 @@
+import heapq
+import numpy as np
+import logs
+import profiling
 import utils
+import wakeup
 
 # To maintain track of current usage with total capacity of a resource
 UZI = {}
 
-IS_VERBOSE = True
+scheduler_log = logs.get_logger('scheduler')
+constraints_log = logs.get_logger('constraints')
 
+# Job queues at least this long have their constraints evaluated in one vectorized pass
+BATCHED_QUEUE_SIZE = 32
 
-def fetch_resource_available_slot(resource_logs, resource_id, verbose=IS_VERBOSE):
+
+def fetch_resource_available_slot(resource_logs, resource_id):
     '''
     To return the time at which the given resource becomes available again 
     '''
-    available_from = resource_logs[resource_id][-1]['end_time'] if resource_logs[resource_id] else 0
-    if verbose: print(f'{resource_id} is available from {available_from}')
+    available_from = resource_logs[resource_id].available_from
+    constraints_log.debug('%s is available from %s', resource_id, available_from)
     return available_from
 
 
-def schedule_on_fog(architecture, job, runtime_values, verbose=IS_VERBOSE):
+def fetch_resource_start_time(architecture, resource_id, arrival_time, duration):
+    '''
+    To return the earliest time the job can start on the resource, given the time it occupies the resource for
+
+    By default jobs are appended after the last job of the resource. With backfill_gaps, the job
+    starts in the earliest idle gap between the jobs of the resource that it fits in.
+    '''
+    if architecture.get('backfill_gaps'):
+        start_time = architecture['resource_logs'][resource_id].find_earliest_start(arrival_time, duration)
+        constraints_log.debug('%s has a gap of %s from %s', resource_id, duration, start_time)
+        return start_time
+    return max(arrival_time, fetch_resource_available_slot(architecture['resource_logs'], resource_id))
+
+
+def register_completion(architecture, resource_id, job, end_time):
+    '''
+    To queue the release of the job storage on the resource at the end time of the job
+    '''
+    # A job ending before the current tick is never released (as with the tick loop)
+    if end_time >= architecture['clock']:
+        heapq.heappush(architecture['completions'], (end_time, job['id'], resource_id, job['job_size']))
+
+
+def trace_decision(architecture, job, decision, resource_id=None, start_time=None, end_time=None):
+    '''
+    To log a scheduling decision and record it in the decision trace of the architecture, if any
+    '''
+    scheduler_log.debug('%s %s on %s from %s to %s', job['id'], decision, resource_id, start_time, end_time)
+
+    decision_trace = architecture.get('decision_trace')
+    if decision_trace is not None:
+        decision_trace.record({'clock': architecture.get('clock'), 'job_id': job['id'], 'category': job['category'],
+                               'decision': decision, 'resource_id': resource_id, 'start_time': start_time, 'end_time': end_time})
+
+
+def change_used_capacity(architecture, resource_id, resource, job_size, tick):
+    '''
+    To add job_size to the used capacity of a resource (a negative size frees it), effective from the given tick
+    '''
+    resource['used_capacity'] += job_size
+    architecture['resource_utilization'].change(resource_id, 100 * resource['used_capacity'] / resource['total_capacity'], tick)
+
+    # The jobs waiting on the resource may now be decided differently
+    wakeup_index = architecture.get('wakeup_index')
+    if wakeup_index is not None:
+        wakeup_index.wake_resource(resource_id)
+
+
+def mark_resource_changed(architecture, resource_id):
+    '''
+    To make the batched constraints of the remaining jobs on the resource be evaluated again
+    '''
+    batch = architecture.get('constraint_batch')
+    if batch is not None:
+        batch['dirty'].add(resource_id)
+
+
+def schedule_on_fog(architecture, job, runtime_values):
     F = architecture['F']
     fdc_id = runtime_values['resource_id']
     resource_logs = architecture['resource_logs']
 
     # Schedule the job on the resource
-    resource_logs[fdc_id].append({'job_id': job['id'],
-                                'start_time': runtime_values['start_time'],
-                                'end_time': runtime_values['end_time']})
+    resource_logs[fdc_id].add_job(job['id'], runtime_values['start_time'], runtime_values['end_time'])
     
-    job_size = 64 * job['instructions']
-    F[fdc_id]['used_capacity'] += job_size
+    change_used_capacity(architecture, fdc_id, F[fdc_id], job['job_size'], architecture['clock'])
 
-    architecture['executed_jobs'][job['id']] = {'resource': fdc_id, 'end_time': runtime_values['end_time']}
+    architecture['executed_jobs'][job['id']] = {'resource': fdc_id, 'end_time': runtime_values['end_time'], 'deadline': job['deadline']}
+    architecture['metrics'].record_job(runtime_values['start_time'], runtime_values['end_time'], job['deadline'])
+    register_completion(architecture, fdc_id, job, runtime_values['end_time'])
+    mark_resource_changed(architecture, fdc_id)
     architecture['end_at'] = max(architecture['end_at'], runtime_values['end_time'])
 
-    if verbose: print(f"{job['id']} scheduled on {fdc_id} from {runtime_values['start_time']} to {runtime_values['end_time']}")
+    trace_decision(architecture, job, 'scheduled', fdc_id, runtime_values['start_time'], runtime_values['end_time'])
     return architecture
 
 
-def schedule_on_cloud(architecture, job, runtime_values, verbose=IS_VERBOSE):
+def schedule_on_cloud(architecture, job, runtime_values):
     C = architecture['C']
     cdc_id = runtime_values['resource_id']
     resource_logs = architecture['resource_logs']
 
     # Schedule the job on the resource
-    resource_logs[cdc_id].append({'job_id': job['id'],
-                                'start_time': runtime_values['start_time'],
-                                'end_time': runtime_values['end_time']})
+    resource_logs[cdc_id].add_job(job['id'], runtime_values['start_time'], runtime_values['end_time'])
     
-    job_size = 64 * job['instructions']
-    C[cdc_id]['used_capacity'] += job_size
+    change_used_capacity(architecture, cdc_id, C[cdc_id], job['job_size'], architecture['clock'])
 
-    architecture['executed_jobs'][job['id']] = {'resource': cdc_id, 'end_time': runtime_values['end_time']}
+    architecture['executed_jobs'][job['id']] = {'resource': cdc_id, 'end_time': runtime_values['end_time'], 'deadline': job['deadline']}
+    architecture['metrics'].record_job(runtime_values['start_time'], runtime_values['end_time'], job['deadline'])
+    register_completion(architecture, cdc_id, job, runtime_values['end_time'])
+    mark_resource_changed(architecture, cdc_id)
     architecture['end_at'] = max(architecture['end_at'], runtime_values['end_time'])
 
-    if verbose: print(f"{job['id']} scheduled on {cdc_id} from {runtime_values['start_time']} to {runtime_values['end_time']}")
+    trace_decision(architecture, job, 'scheduled', cdc_id, runtime_values['start_time'], runtime_values['end_time'])
     return architecture
 
 
-def check_fdc_deadline_constraint(architecture, job, is_native=True, verbose=IS_VERBOSE):
-    F = architecture['F']
-    EU = architecture['EU']
+def fetch_available_slots(resource_logs, resources, indices):
+    '''
+    To return the time at which each of the indexed resources becomes available again
+    '''
+    available_from = np.zeros(len(resources), dtype=np.int64)
+    for i in np.unique(indices).tolist():
+        available_from[i] = resource_logs[resources.ids[i]].available_from
+    return available_from[indices]
+
+
+def fetch_gap_start_times(resource_logs, resources, indices, arrival_times, durations):
+    '''
+    To return the earliest start of each job in an idle gap of its indexed resource
+    '''
+    return np.array([resource_logs[resources.ids[i]].find_earliest_start(arrival_time, duration)
+                     for i, arrival_time, duration in zip(indices.tolist(), arrival_times.tolist(), durations.tolist())], dtype=np.int64)
+
+
+def evaluate_queue_constraints(architecture, jobs):
+    '''
+    To evaluate the z-scores and the constraints on fn, fp, cn and cp of all jobs in the queue in one pass
+
+    The runtime plus communication delay of each job on each resource was computed when the job
+    arrived (see precompute_job_quantities). Once a job is scheduled on a resource, the later jobs
+    re-evaluate their constraints on that resource from these durations and the new resource state.
+    With backfill_gaps, the gap search of each job cannot be vectorized and runs job by job.
+    '''
+    C, F = architecture['C'], architecture['F']
     resource_logs = architecture['resource_logs']
+    ensure_job_quantities(architecture, jobs)
+
+    arrival_times = np.array([job['arrival_time'] for job in jobs], dtype=np.int64)
+    deadlines = np.array([job['deadline'] for job in jobs], dtype=np.int64)
+    eu_rows = np.array([architecture['eu_index'][job['eu']] for job in jobs], dtype=np.int64)
+    links = architecture['eu_links'][eu_rows]
+    durations = np.array([job['durations'] for job in jobs], dtype=np.int64)
+    job_sizes = np.array([job['job_size'] for job in jobs], dtype=np.int64)
+
+    # Normalize the deadlines over the queue
+    d_min, d_max = deadlines.min(), deadlines.max()
+    z_scores = (deadlines - d_min) / (d_max - d_min) if d_max > d_min else np.zeros(len(jobs))
+
+    end_times = np.empty(links.shape, dtype=np.int64)
+    is_space_constraint_satisfied = np.empty(links.shape, dtype=bool)
+
+    for link, column in utils.LINK_INDEX.items():
+        resources = F if link in ('fn', 'fp') else C
+        indices = links[:, column]
+        if architecture.get('backfill_gaps'):
+            start_times = fetch_gap_start_times(resource_logs, resources, indices, arrival_times, durations[:, column])
+        else:
+            start_times = np.maximum(arrival_times, fetch_available_slots(resource_logs, resources, indices))
+        end_times[:, column] = start_times + durations[:, column]
+        is_space_constraint_satisfied[:, column] = job_sizes <= resources.available_capacity()[indices]
+
+    return {'rows': {job['id']: i for i, job in enumerate(jobs)},
+            'z_scores': z_scores.tolist(),
+            'links': links,
+            'durations': durations,
+            'end_times': end_times,
+            'is_deadline_constraint_satisfied': end_times <= deadlines[:, None],
+            'is_space_constraint_satisfied': is_space_constraint_satisfied,
+            'dirty': set()}
+
+
+def fetch_batched_resource_id(architecture, job, link):
+    batch = architecture['constraint_batch']
+    row, column = batch['rows'][job['id']], utils.LINK_INDEX[link]
+    resources = architecture['F'] if link in ('fn', 'fp') else architecture['C']
+    return resources.ids[batch['links'][row, column]], row, column
+
+
+def check_batched_deadline_constraint(architecture, job, link):
+    batch = architecture['constraint_batch']
+    resource_id, row, column = fetch_batched_resource_id(architecture, job, link)
+    duration = int(batch['durations'][row, column])
+
+    # Re-evaluate only if a job was scheduled on the resource since the batch was computed
+    if resource_id in batch['dirty']:
+        start_time = fetch_resource_start_time(architecture, resource_id, job['arrival_time'], duration)
+        end_time = start_time + duration
+        is_satisfied = end_time <= job['deadline']
+    else:
+        end_time = int(batch['end_times'][row, column])
+        start_time = end_time - duration
+        is_satisfied = bool(batch['is_deadline_constraint_satisfied'][row, column])
+
+    runtime_values = {'job_id': job['id'], 'resource_id': resource_id, 'start_time': start_time, 'end_time': end_time}
+    constraints_log.debug('runtime_values %s', runtime_values)
+
+    return is_satisfied, runtime_values
+
+
+def check_batched_space_constraint(architecture, job, link):
+    batch = architecture['constraint_batch']
+    resource_id, row, column = fetch_batched_resource_id(architecture, job, link)
+
+    # Re-evaluate only if a job was scheduled on the resource since the batch was computed
+    if resource_id in batch['dirty']:
+        resource = utils.fetch_resource(architecture, resource_id)
+        return job['job_size'] <= resource['total_capacity'] - resource['used_capacity']
+    return bool(batch['is_space_constraint_satisfied'][row, column])
+
+
+def is_job_batched(architecture, job):
+    batch = architecture.get('constraint_batch')
+    return batch is not None and job['id'] in batch['rows']
+
+
+def check_fdc_deadline_constraint(architecture, job, is_native=True):
+    if is_job_batched(architecture, job):
+        return check_batched_deadline_constraint(architecture, job, 'fn' if is_native else 'fp')
 
     # Extract the native/public fdc id
-    fdc_id = utils.fetch_native_fog_for_job(EU, job) if is_native else utils.fetch_public_fog_for_job(EU, job)
-    resource = F[fdc_id]
+    column = utils.LINK_INDEX['fn' if is_native else 'fp']
+    fdc_id = job['resource_ids'][column]
 
-    if verbose: print(f"Checking deadline constraint for {job['id']} on {fdc_id}...")
+    constraints_log.debug('Checking deadline constraint for %s on %s...', job['id'], fdc_id)
 
     # Check for resource availability
-    start_time = max(job['arrival_time'], fetch_resource_available_slot(resource_logs, fdc_id))
+    start_time = fetch_resource_start_time(architecture, fdc_id, job['arrival_time'], job['durations'][column])
 
-    # Calculate the job execution time and the communication delay
-    latency_delay = utils.fetch_communication_delay(job, resource, EU[job['eu']], F[fdc_id])
-    runtime = utils.calculate_runtime(resource, job)
-    end_time = start_time + runtime + latency_delay
+    # Add the job execution time and the communication delay, computed when the job arrived
+    end_time = start_time + job['durations'][column]
 
     runtime_values = {'job_id': job['id'], 'resource_id': fdc_id, 'start_time': start_time, 'end_time': end_time}
-    if verbose: print('runtime_values', runtime_values)
+    constraints_log.debug('runtime_values %s', runtime_values)
 
     return end_time <= job['deadline'], runtime_values
 
 
-def check_fdc_space_constraint(architecture, job, is_native=True, verbose=IS_VERBOSE):
-    job_size = 64 * job['instructions']
+def check_fdc_space_constraint(architecture, job, is_native=True):
+    if is_job_batched(architecture, job):
+        return check_batched_space_constraint(architecture, job, 'fn' if is_native else 'fp')
+
+    job_size = job['job_size']
     F = architecture['F']
-    EU = architecture['EU']
-    fdc_id = utils.fetch_native_fog_for_job(EU, job) if is_native else utils.fetch_public_fog_for_job(EU, job)
+    fdc_id = job['resource_ids'][utils.LINK_INDEX['fn' if is_native else 'fp']]
     available_resource_capacity = F[fdc_id]['total_capacity'] - F[fdc_id]['used_capacity']
-    if verbose: print(f'{job_size} | Required: {job_size} | Available @{fdc_id}: {available_resource_capacity}')
+    constraints_log.debug('Required: %s | Available @%s: %s', job_size, fdc_id, available_resource_capacity)
     return job_size <= available_resource_capacity
 
 
-def check_cdc_deadline_constraint(architecture, job, is_native=True, verbose=IS_VERBOSE):
-    C = architecture['C']
-    F = architecture['F']
-    EU = architecture['EU']
-    resource_logs = architecture['resource_logs']
+def check_cdc_deadline_constraint(architecture, job, is_native=True):
+    if is_job_batched(architecture, job):
+        return check_batched_deadline_constraint(architecture, job, 'cn' if is_native else 'cp')
 
     # Extract the native/public cdc id
-    cdc_id = utils.fetch_native_cloud_for_job(F, EU, job) if is_native else utils.fetch_public_cloud_for_job(F, EU, job)
-    resource = C[cdc_id]
+    column = utils.LINK_INDEX['cn' if is_native else 'cp']
+    cdc_id = job['resource_ids'][column]
 
-    if verbose: print(f"Checking deadline constraint for {job['id']} on {cdc_id}...")
+    constraints_log.debug('Checking deadline constraint for %s on %s...', job['id'], cdc_id)
 
     # Check for resource availability
-    start_time = max(job['arrival_time'], fetch_resource_available_slot(resource_logs, cdc_id))
-
-    latency_delay = utils.fetch_communication_delay(job, resource, EU[job['eu']], C[cdc_id])
-    runtime = utils.calculate_runtime(resource, job)
-    end_time = start_time + runtime + latency_delay
+    start_time = fetch_resource_start_time(architecture, cdc_id, job['arrival_time'], job['durations'][column])
+    end_time = start_time + job['durations'][column]
 
     runtime_values = {'job_id': job['id'], 'resource_id': cdc_id, 'start_time': start_time, 'end_time': end_time}
-    if verbose: print('runtime_values', runtime_values)
+    constraints_log.debug('runtime_values %s', runtime_values)
 
     return end_time <= job['deadline'], runtime_values
 
 
-def check_cdc_space_constraint(architecture, job, is_native=True, verbose=IS_VERBOSE):
-    job_size = 64 * job['instructions']
+def check_cdc_space_constraint(architecture, job, is_native=True):
+    if is_job_batched(architecture, job):
+        return check_batched_space_constraint(architecture, job, 'cn' if is_native else 'cp')
+
+    job_size = job['job_size']
     C = architecture['C']
-    F = architecture['F']
-    EU = architecture['EU']
-    cdc_id = utils.fetch_native_cloud_for_job(F, EU, job) if is_native else utils.fetch_public_cloud_for_job(F, EU, job)
+    cdc_id = job['resource_ids'][utils.LINK_INDEX['cn' if is_native else 'cp']]
     available_resource_capacity = C[cdc_id]['total_capacity'] - C[cdc_id]['used_capacity']
-    if verbose: print(f'Required: {job_size} | Available @{cdc_id}: {available_resource_capacity}')
+    constraints_log.debug('Required: %s | Available @%s: %s', job_size, cdc_id, available_resource_capacity)
     return job_size <= available_resource_capacity
 
 
-def calculate_utilization(resource, verbose=IS_VERBOSE):
+def precompute_job_quantities(architecture, jobs):
+    '''
+    To compute at once the quantities of the jobs that stay the same until they are scheduled
+
+    Each job gets its job_size, the ids of its fn, fp, cn and cp (resource_ids) and its runtime plus
+    communication delay on each of them (durations), in the order of utils.LINKS. These are computed
+    as utils.calculate_runtime and utils.calculate_transmission_delay do, plus the propagation delays
+    of the end-user computed at set-up (see utils.build_propagation_delay_table).
+    '''
+    if not jobs:
+        return jobs
+
+    C, F = architecture['C'], architecture['F']
+    instructions = np.array([job['instructions'] for job in jobs], dtype=np.int64)
+    eu_rows = np.array([architecture['eu_index'][job['eu']] for job in jobs], dtype=np.int64)
+    links = architecture['eu_links'][eu_rows]
+    propagation_delays = architecture['propagation_delays'][eu_rows]
+
+    durations = np.empty(links.shape, dtype=np.int64)
+    resource_ids = []
+
+    for link, column in utils.LINK_INDEX.items():
+        resources = F if link in ('fn', 'fp') else C
+        indices = links[:, column]
+
+        runtimes = np.ceil(10**3 * instructions / resources.column('total_Mips')[indices]).astype(np.int64)
+        transmission_delays = np.ceil(1000 * 64 * instructions / resources.column('BW')[indices]).astype(np.int64)
+        durations[:, column] = runtimes + transmission_delays + propagation_delays[:, column]
+        resource_ids.append([resources.ids[i] for i in indices.tolist()])
+
+    # For each job, store its quantities as plain python values
+    for job, job_resource_ids, job_durations in zip(jobs, zip(*resource_ids), durations.tolist()):
+        job['job_size'] = 64 * job['instructions']
+        job['resource_ids'] = job_resource_ids
+        job['durations'] = tuple(job_durations)
+
+    return jobs
+
+
+def ensure_job_quantities(architecture, jobs):
+    '''
+    To precompute the quantities of the jobs that were handed to the scheduler without them
+    '''
+    missing = [job for job in jobs if 'durations' not in job]
+    if missing:
+        precompute_job_quantities(architecture, missing)
+
+
+def calculate_utilization(resource):
     UZI = resource['used_capacity'] / resource['total_capacity']
-    if verbose: print(f"@{resource['id']} UZI: {UZI}")
+    constraints_log.debug('@%s UZI: %s', resource['id'], UZI)
     return UZI
 
 
@@ -146,6 +364,7 @@ def allocate_classified_jobs(architecture, job):
     if (is_native_fog_deadline_constraint_satisfied and is_native_fog_space_constraint_satisfied) and z_score <= z_score_threshold:
 
         # 4: schedule j on fn
+        profiling.count_step('classified', 4)
         architecture = schedule_on_fog(architecture, job, fn_runtime_values)
         return architecture
 
@@ -156,18 +375,20 @@ def allocate_classified_jobs(architecture, job):
     if (is_native_cloud_deadline_constraint_satisfied and is_native_cloud_space_constraint_satisfied) and z_score > z_score_threshold:
         
         # 6: schedule j on cn
+        profiling.count_step('classified', 6)
         architecture = schedule_on_cloud(architecture, job, cn_runtime_values)
 
 		# 7: else if (D1 or S1 does not holds on fn) then
     elif not is_native_fog_deadline_constraint_satisfied or not is_native_fog_space_constraint_satisfied:
 			
         # 8: MIGRATION()
+        profiling.count_step('classified', 8)
         architecture = migration(architecture, job, fn_runtime_values=fn_runtime_values, cn_runtime_values=cn_runtime_values)
 
 		# 9: else
     else:
         # 10: try scheduling j later
-        pass
+        profiling.count_try_later('classified', 10)
     # 11: end if
 
     return architecture
@@ -180,9 +401,7 @@ def allocate_classified_jobs(architecture, job):
 # 2: for selected job j having tag = tr do
 def allocate_restricted_jobs(architecture, job):
     C = architecture['C']
-    F = architecture['F']
-    EU = architecture['EU']
-    cdc_id = utils.fetch_native_cloud_for_job(F, EU, job)
+    cdc_id = job['resource_ids'][utils.LINK_INDEX['cn']]
 
     # Calculate the quantities
     SF = architecture['SF']
@@ -198,6 +417,7 @@ def allocate_restricted_jobs(architecture, job):
     if (is_public_fog_deadline_constraint_satisfied and is_public_fog_space_constraint_satisfied) and z_score <= z_score_threshold:
 
         # 4: schedule j on fp
+        profiling.count_step('restricted', 4)
         architecture = schedule_on_fog(architecture, job, fp_runtime_values)
         return architecture
 		
@@ -208,25 +428,27 @@ def allocate_restricted_jobs(architecture, job):
     if (is_native_cloud_deadline_constraint_satisfied and is_native_cloud_space_constraint_satisfied) and z_score > z_score_threshold and cdc_UZI <= SF:
 
         # 6: schedule j on cn
+        profiling.count_step('restricted', 6)
         architecture = schedule_on_cloud(architecture, job, cn_runtime_values)
 
     # 7: else if (D2 & S2 holds on cn) && (z-score > 0.5) && (UZI > SF) then
     elif (is_native_cloud_deadline_constraint_satisfied and is_native_cloud_space_constraint_satisfied) and z_score > z_score_threshold and cdc_UZI > SF:
 
         # 8: try scheduling j later
-        pass
+        profiling.count_try_later('restricted', 8)
 	
     # 9: else if (D1 or S1 does not holds on fp) then
     elif not is_public_fog_deadline_constraint_satisfied or not is_public_fog_space_constraint_satisfied:
 
         # 10: MIGRATION()
+        profiling.count_step('restricted', 10)
         architecture = migration(architecture, job, fp_runtime_values=fp_runtime_values, cn_runtime_values=cn_runtime_values)
 
     # 11: else
     else:
      
         # 12: try scheduling j later
-        pass
+        profiling.count_try_later('restricted', 12)
     
     # 13: end if
     
@@ -240,13 +462,12 @@ def allocate_restricted_jobs(architecture, job):
 # 2: for selected job j having tag = tp do
 def allocate_public_jobs(architecture, job):
     F = architecture['F']
-    EU = architecture['EU']
 
     # Calculate the quantities
     z_score = job['z_score']
     SF = architecture['SF']
     z_score_threshold = architecture['z_score_threshold']
-    public_fdc_id = utils.fetch_public_fog_for_job(EU, job)
+    public_fdc_id = job['resource_ids'][utils.LINK_INDEX['fp']]
     public_fdc_UZI = calculate_utilization(F[public_fdc_id])
 
     # Evaluate the constraints
@@ -257,6 +478,7 @@ def allocate_public_jobs(architecture, job):
     if (is_public_fog_deadline_constraint_satisfied and is_public_fog_space_constraint_satisfied) and z_score <= z_score_threshold and public_fdc_UZI <= SF:
 
         # 4: schedule j on fp
+        profiling.count_step('public', 4)
         architecture = schedule_on_fog(architecture, job, fp_runtime_values)
         return architecture
     
@@ -271,20 +493,26 @@ def allocate_public_jobs(architecture, job):
     if (is_public_fog_deadline_constraint_satisfied and is_public_fog_space_constraint_satisfied) and z_score <= z_score_threshold and public_fdc_UZI > SF:
 
         # 6: schedule j on cp
+        profiling.count_step('public', 6)
         architecture = schedule_on_cloud(architecture, job, cp_runtime_values)
 
     # 7: else if (D2 & S2 holds on cn) && (z-score > 0.5) then
     elif (is_public_cloud_deadline_constraint_satisfied and is_public_cloud_space_constraint_satisfied) and z_score > z_score_threshold:
 
         # 8: schedule j on cp
+        profiling.count_step('public', 8)
         architecture = schedule_on_cloud(architecture, job, cp_runtime_values)
 
     # 9: else if (D1 or S1 does not holds on fp) then
     elif not is_public_fog_deadline_constraint_satisfied or not is_public_fog_space_constraint_satisfied:
 
         # 10: MIGRATION()
+        profiling.count_step('public', 10)
         architecture = migration(architecture, job, fp_runtime_values=fp_runtime_values, cp_runtime_values=cp_runtime_values)
 
+    else:
+        profiling.count_try_later('public')
+
     # 11: end if
 
     return architecture
@@ -304,7 +532,6 @@ def fetch_waiting_bit(r1, r2):
 def migration(architecture, job, fn_runtime_values=None, fp_runtime_values=None, cn_runtime_values=None, cp_runtime_values=None):
     C = architecture['C']
     F = architecture['F']
-    EU = architecture['EU']
     SF = architecture['SF']
 
     # 2: if WB = 1 then
@@ -318,15 +545,17 @@ def migration(architecture, job, fn_runtime_values=None, fp_runtime_values=None,
         
         # 6: migrate j from fn to cn
         if WB:
+            profiling.count_step('migration', 3)
             architecture = schedule_on_fog(architecture, job, fn_runtime_values)
         else:
+            profiling.count_step('migration', 6)
             architecture = schedule_on_cloud(architecture, job, cn_runtime_values)
 
     # 7: end for
 
     # 8: for job j has tag = tc do
     elif job['category'] == "tr":
-        fn_id = utils.fetch_native_fog_for_job(EU, job)
+        fn_id = job['resource_ids'][utils.LINK_INDEX['fn']]
         fn_UZI = calculate_utilization(F[fn_id])
         _, runtime_values = check_fdc_deadline_constraint(architecture, job, is_native=True)
         WB_1 = fetch_waiting_bit(fp_runtime_values, runtime_values)
@@ -336,15 +565,18 @@ def migration(architecture, job, fn_runtime_values=None, fp_runtime_values=None,
         if fn_UZI <= SF and not WB_1:
 
             # 10: migrate j from fp to fn
+            profiling.count_step('migration', 10)
             architecture = schedule_on_fog(architecture, job, runtime_values)
 
         # 11: else if WB = 0 then
         elif not WB_2:
 
             # 12: migrate j from fp to cn
+                profiling.count_step('migration', 12)
                 architecture = schedule_on_cloud(architecture, job, cn_runtime_values)
 
         else:
+            profiling.count_branch('migration', 'keep_on_fp')
             architecture = schedule_on_fog(architecture, job, fp_runtime_values)
 
         # 13: end if
@@ -353,10 +585,9 @@ def migration(architecture, job, fn_runtime_values=None, fp_runtime_values=None,
 
     # 15: for job j has tag = tp do
     if job['category'] == "tp":
-        fn_id = utils.fetch_native_fog_for_job(EU, 
-                                               job)
+        fn_id = job['resource_ids'][utils.LINK_INDEX['fn']]
         fn_UZI = calculate_utilization(F[fn_id])
-        cn_id = utils.fetch_native_cloud_for_job(F, EU, job)
+        cn_id = job['resource_ids'][utils.LINK_INDEX['cn']]
         cn_UZI = calculate_utilization(C[cn_id])
 
         _, runtime_values_1 = check_fdc_deadline_constraint(architecture, job, is_native=True)
@@ -370,21 +601,25 @@ def migration(architecture, job, fn_runtime_values=None, fp_runtime_values=None,
         if fn_UZI <= SF and not WB_1:
             
             # 17: migrate j from fp to fn
+            profiling.count_step('migration', 17)
             architecture = schedule_on_fog(architecture, job, runtime_values_1)
 
         # 18: else if cn has UZI < SF && WB = 0 then
         elif cn_UZI <= SF and not WB_2:
             
             # 19: migrate j from fp to cn
+            profiling.count_step('migration', 19)
             architecture = schedule_on_cloud(architecture, job, runtime_values_2)
 
         # 20: else if WB = 0 then
         elif not WB_3:
 
             # 21: migrate j from fp to cp
+            profiling.count_step('migration', 21)
             architecture = schedule_on_cloud(architecture, job, cp_runtime_values)
         
         else:
+            profiling.count_branch('migration', 'keep_on_fp')
             architecture = schedule_on_fog(architecture, job, fp_runtime_values)
 
         # 22: end if
@@ -399,6 +634,9 @@ def migration(architecture, job, fn_runtime_values=None, fp_runtime_values=None,
 # Output: Data scheduled on fog or cloud node.
 # 1: procedure ALGORITHM()
 def algorithm(architecture, jobs):
+    if isinstance(jobs, wakeup.WakeupIndex):
+        return algorithm_with_wakeups(architecture, jobs)
+
     total_jobs = len(jobs)
     
     # 2: Compute quantities (mention here specifically).
@@ -411,120 +649,213 @@ def algorithm(architecture, jobs):
 
     d_min = min(job_deadlines)
     d_max = max(job_deadlines)
+    ensure_job_quantities(architecture, jobs)
+
+    # Evaluate the z-scores and constraints of a long queue at once
+    z_scores = None
+    if total_jobs >= BATCHED_QUEUE_SIZE:
+        architecture['constraint_batch'] = evaluate_queue_constraints(architecture, jobs)
+        z_scores = architecture['constraint_batch']['z_scores']
 
     # For each job in the job queue
     for i in range(total_jobs):
-        print('-'*100)
 
-        if d_max > d_min: jobs[i]['z_score'] = (jobs[i]['deadline'] - d_min) / (d_max - d_min)
+        if z_scores is not None: jobs[i]['z_score'] = z_scores[i]
+        elif d_max > d_min: jobs[i]['z_score'] = (jobs[i]['deadline'] - d_min) / (d_max - d_min)
         else: jobs[i]['z_score'] = 0.0
 
-        # 4: for selected job j having tag = tc do
-        if jobs[i]['category'] == "tc":
-        
-            # 5: CLASSIFIED()
-            architecture = allocate_classified_jobs(architecture, jobs[i])
+        architecture = allocate_job(architecture, jobs[i])
 
-        # 7: for selected job j having tag = tr do
-        elif jobs[i]['category'] == "tr":
-        
-            # 8: RESTRICTED()
-            architecture = allocate_restricted_jobs(architecture, jobs[i])
+    architecture['constraint_batch'] = None
+    return architecture
+# 13: end procedure
 
-        # 10: for selected job j having tag = tp do
-        elif jobs[i]['category'] == "tp":
 
-            # 11: PUBLIC()
-            architecture = allocate_public_jobs(architecture, jobs[i])
+def allocate_job(architecture, job):
+    if 'durations' not in job:
+        precompute_job_quantities(architecture, [job])
+
+    # Retire the job if it can no longer meet its deadline on any of its resources
+    if architecture.get('prune_infeasible') and drop_infeasible_job(architecture, job):
+        return architecture
+
+    # 4: for selected job j having tag = tc do
+    if job['category'] == "tc":
+    
+        # 5: CLASSIFIED()
+        architecture = allocate_classified_jobs(architecture, job)
+
+    # 7: for selected job j having tag = tr do
+    elif job['category'] == "tr":
+    
+        # 8: RESTRICTED()
+        architecture = allocate_restricted_jobs(architecture, job)
+
+    # 10: for selected job j having tag = tp do
+    elif job['category'] == "tp":
+
+        # 11: PUBLIC()
+        architecture = allocate_public_jobs(architecture, job)
 
     # 6: end for
     # 9: end for
     # 12: end for
 
+    if job['id'] not in architecture['executed_jobs']:
+        trace_decision(architecture, job, 'deferred')
     return architecture
-# 13: end procedure
 
 
+def calculate_completion_lower_bound(architecture, job):
+    '''
+    To return the earliest end time the job could get on any of its fn, fp, cn and cp
+
+    A resource only becomes available later as jobs are scheduled on it (with backfill_gaps, its
+    idle gaps only shrink), while the runtime and the communication delay of the job on it stay the
+    same, so the bound never decreases.
+    '''
+    lower_bound = None
+
+    for resource_id, duration in zip(job['resource_ids'], job['durations']):
+        start_time = fetch_resource_start_time(architecture, resource_id, job['arrival_time'], duration)
+        end_time = start_time + duration
+        lower_bound = end_time if lower_bound is None else min(lower_bound, end_time)
+
+    return lower_bound
+
+
+def drop_infeasible_job(architecture, job):
+    '''
+    To retire the job as dropped when it would miss its deadline wherever it is scheduled, now or later
+    '''
+    lower_bound = calculate_completion_lower_bound(architecture, job)
+    if lower_bound <= job['deadline']:
+        return False
+
+    architecture['dropped_jobs'][job['id']] = {'deadline': job['deadline'], 'earliest_end_time': lower_bound}
+    architecture['metrics'].record_drop()
+    trace_decision(architecture, job, 'dropped', end_time=lower_bound)
+    return True
+
+
+def algorithm_with_wakeups(architecture, wakeup_index):
+    '''
+    To run Algorithm 1 on the jobs of a wake-up index that may be decided differently than in their last pass
+
+    The z-scores are normalized over the whole queue, as in algorithm. Jobs that are left in the
+    queue sleep until one of their resources changes or their z-score crosses the threshold.
+    '''
+    if not wakeup_index:
+        return architecture
+
+    d_min, d_max = wakeup_index.start_pass(architecture)
+    z_score_threshold = architecture['z_score_threshold']
+
+    # Evaluate the constraints of many awake jobs at once
+    if len(wakeup_index.awake) >= BATCHED_QUEUE_SIZE:
+        architecture['constraint_batch'] = evaluate_queue_constraints(architecture, wakeup_index.awake_jobs())
+
+    # For each awake job, in queue order
+    while (entry := wakeup_index.next_job()) is not None:
+        seq, job = entry
+        job['z_score'] = wakeup.calculate_z_score(job['deadline'], d_min, d_max)
+        architecture = allocate_job(architecture, job)
+
+        has_left_queue = job['id'] in architecture['executed_jobs'] or job['id'] in architecture['dropped_jobs']
+        resource_ids = () if has_left_queue else job['resource_ids']
+        wakeup_index.finish_job(seq, has_left_queue, resource_ids, job['z_score'] <= z_score_threshold)
 
-def schedule_on_fdc_only(architecture, fdc_id, job, verbose=IS_VERBOSE):
+    architecture['constraint_batch'] = None
+    return architecture
+
+
+
+def schedule_on_fdc_only(architecture, fdc_id, job):
     F = architecture['F']
     EU = architecture['EU']
+    if 'durations' not in job:
+        precompute_job_quantities(architecture, [job])
 
     resource = F[fdc_id]
     resource_logs = architecture['resource_logs']
 
-    # Check for resource availability
-    start_time = max(job['arrival_time'], fetch_resource_available_slot(resource_logs, fdc_id))
-
     # Calculate the job execution time and the communication delay
-    latency_delay = utils.fetch_communication_delay(job, resource, EU[job['eu']], F[fdc_id])
-    runtime = utils.calculate_runtime(resource, job)
-    end_time = start_time + runtime + latency_delay
+    if fdc_id == job['resource_ids'][utils.LINK_INDEX['fn']]:
+        duration = job['durations'][utils.LINK_INDEX['fn']]
+    else:
+        latency_delay = utils.fetch_communication_delay(job, resource, EU[job['eu']], F[fdc_id])
+        duration = utils.calculate_runtime(resource, job) + latency_delay
+
+    # Check for resource availability
+    start_time = fetch_resource_start_time(architecture, fdc_id, job['arrival_time'], duration)
+    end_time = start_time + duration
 
     # Schedule the job on the resource
-    resource_logs[fdc_id].append({'job_id': job['id'],
-                                'start_time': start_time,
-                                'end_time': end_time})
+    resource_logs[fdc_id].add_job(job['id'], start_time, end_time)
     
-    job_size = 64 * job['instructions']
-    F[fdc_id]['used_capacity'] += job_size
+    change_used_capacity(architecture, fdc_id, F[fdc_id], job['job_size'], architecture['clock'])
 
-    architecture['executed_jobs'][job['id']] = {'resource': fdc_id, 'end_time': end_time}
+    architecture['executed_jobs'][job['id']] = {'resource': fdc_id, 'end_time': end_time, 'deadline': job['deadline']}
+    architecture['metrics'].record_job(start_time, end_time, job['deadline'])
+    register_completion(architecture, fdc_id, job, end_time)
     architecture['end_at'] = max(architecture['end_at'], end_time)
 
-    if verbose: print(f"{job['id']} scheduled on {fdc_id} from {start_time} to {end_time}")
+    trace_decision(architecture, job, 'scheduled', fdc_id, start_time, end_time)
     return architecture
 
 
 
 def fdc_algorithm(architecture, jobs):
-    EU = architecture['EU']
+    ensure_job_quantities(architecture, jobs)
 
     for job in jobs:
-        fn_id = utils.fetch_native_fog_for_job(EU, job)
+        fn_id = job['resource_ids'][utils.LINK_INDEX['fn']]
         architecture = schedule_on_fdc_only(architecture, fn_id, job)
 
     return architecture
 
 
-def schedule_on_cdc_only(architecture, cdc_id, job, verbose=IS_VERBOSE):
+def schedule_on_cdc_only(architecture, cdc_id, job):
 # def schedule_on_fog(architecture, job, runtime_values, verbose=IS_VERBOSE):
     C = architecture['C']
     EU = architecture['EU']
+    if 'durations' not in job:
+        precompute_job_quantities(architecture, [job])
 
     resource = C[cdc_id]
     resource_logs = architecture['resource_logs']
 
-    # Check for resource availability
-    start_time = max(job['arrival_time'], fetch_resource_available_slot(resource_logs, cdc_id))
-
     # Calculate the job execution time and the communication delay
-    latency_delay = utils.fetch_communication_delay(job, resource, EU[job['eu']], C[cdc_id])
-    runtime = utils.calculate_runtime(resource, job)
-    end_time = start_time + runtime + latency_delay
+    if cdc_id == job['resource_ids'][utils.LINK_INDEX['cn']]:
+        duration = job['durations'][utils.LINK_INDEX['cn']]
+    else:
+        latency_delay = utils.fetch_communication_delay(job, resource, EU[job['eu']], C[cdc_id])
+        duration = utils.calculate_runtime(resource, job) + latency_delay
+
+    # Check for resource availability
+    start_time = fetch_resource_start_time(architecture, cdc_id, job['arrival_time'], duration)
+    end_time = start_time + duration
 
     # Schedule the job on the resource
-    resource_logs[cdc_id].append({'job_id': job['id'],
-                                'start_time': start_time,
-                                'end_time': end_time})
+    resource_logs[cdc_id].add_job(job['id'], start_time, end_time)
     
-    job_size = 64 * job['instructions']
-    C[cdc_id]['used_capacity'] += job_size
+    change_used_capacity(architecture, cdc_id, C[cdc_id], job['job_size'], architecture['clock'])
 
-    architecture['executed_jobs'][job['id']] = {'resource': cdc_id, 'end_time': end_time}
+    architecture['executed_jobs'][job['id']] = {'resource': cdc_id, 'end_time': end_time, 'deadline': job['deadline']}
+    architecture['metrics'].record_job(start_time, end_time, job['deadline'])
+    register_completion(architecture, cdc_id, job, end_time)
     architecture['end_at'] = max(architecture['end_at'], end_time)
 
-    if verbose: print(f"{job['id']} scheduled on {cdc_id} from {start_time} to {end_time}")
+    trace_decision(architecture, job, 'scheduled', cdc_id, start_time, end_time)
     return architecture
 
 
 
 def cdc_algorithm(architecture, jobs):
-    F = architecture['F']
-    EU = architecture['EU']
+    ensure_job_quantities(architecture, jobs)
 
     for job in jobs:
-        cn_id = utils.fetch_native_cloud_for_job(F, EU, job)
+        cn_id = job['resource_ids'][utils.LINK_INDEX['cn']]
         architecture = schedule_on_cdc_only(architecture, cn_id, job)
 
     return architecture
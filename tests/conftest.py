@@ -0,0 +1,72 @@
+import copy
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import create_workload
+import simulate
+
+# Small seeded network whose resources are shrunk so that jobs get deferred, migrated and missed
+NETWORK_SIZE = {'g': 5, 'h': 15, 'e': 40, 'N': 2000}
+NETWORK_SEED = 3
+ARRIVAL_RATE = 300
+
+# Capacity divisor of each arrival process: with all jobs arriving at once (batch), deferred jobs are
+# decided again once jobs are scheduled on their resources, while bursty arrivals mostly defer jobs
+# until their z-score changes
+CAPACITY_DIVISORS = {'bursty': 20, 'batch': 50}
+
+
+@pytest.fixture(scope='session')
+def network(request):
+    '''
+    To set-up the cdcs, fdcs, end-users and workload (in order of arrival time) shared by the tests
+
+    The arrival process is bursty, unless a test parametrizes the fixture with another one.
+    '''
+    arrival_process = getattr(request, 'param', 'bursty')
+    C, F, EU, workload = create_workload.set_up_network(**NETWORK_SIZE, seed=NETWORK_SEED, arrival_process=arrival_process, rate=ARRIVAL_RATE)
+    for resource in C + F:
+        resource['total_capacity'] = int(resource['total_capacity'] / CAPACITY_DIVISORS[arrival_process])
+
+    workload = workload.sort_values(by=['arrival_time', 'deadline'], kind='stable')
+    return simulate.register_resources(C), simulate.register_resources(F), simulate.register_resources(EU), workload
+
+
+@pytest.fixture
+def make_architecture(network):
+    '''
+    To return a function setting up a fresh architecture of a strategy, with the given settings
+    '''
+    C, F, EU, _ = network
+
+    def make(strategy='sofnet', **settings):
+        setup, _ = simulate.STRATEGIES[strategy]
+        architecture = setup(copy.deepcopy(C), copy.deepcopy(F), copy.deepcopy(EU))
+        architecture.update({'SF': 0.1, 'z_score_threshold': 0.5}, **settings)
+        return architecture
+
+    return make
+
+
+@pytest.fixture
+def jobs(network):
+    '''
+    To return the jobs of the workload as fresh dicts, in order of arrival time
+    '''
+    return lambda: network[3].to_dict('records')
+
+
+def fetch_outcome(architecture):
+    '''
+    To return what a simulation decided: where and until when each job ran, and which jobs were dropped
+    '''
+    return (sorted((job_id, job['resource'], job['end_time']) for job_id, job in architecture['executed_jobs'].items()),
+            sorted(architecture['dropped_jobs']))
+
+
+@pytest.fixture
+def outcome():
+    return fetch_outcome
@@ -0,0 +1,42 @@
+import pytest
+import checkpoint
+import simulate
+
+# Simulated ms between two snapshots of the test runs
+SNAPSHOT_INTERVAL = 10000
+
+
+@pytest.mark.parametrize('network, strategy, settings', [('bursty', 'sofnet', {}),
+                                                         ('batch', 'sofnet', {}),
+                                                         ('bursty', 'sofnet', {'prune_infeasible': True, 'backfill_gaps': True}),
+                                                         ('bursty', 'fdc', {}),
+                                                         ('bursty', 'cdc', {})], indirect=['network'])
+def test_resuming_from_every_snapshot_gives_the_uninterrupted_results(make_architecture, jobs, outcome, tmp_path, strategy, settings):
+    _, run = simulate.STRATEGIES[strategy]
+    reference = make_architecture(strategy, **settings)
+    run(jobs(), reference)
+
+    path = str(tmp_path / 'snapshot_{clock}.bin')
+    checkpointer = checkpoint.Checkpointer(path, simulated_interval=SNAPSHOT_INTERVAL)
+    architecture = make_architecture(strategy, **settings)
+    run(jobs(), architecture, checkpointer=checkpointer)
+    assert outcome(architecture) == outcome(reference)
+
+    snapshots = sorted(tmp_path.glob('snapshot_*.bin'))
+    assert len(snapshots) == checkpointer.snapshots > 1
+
+    # For each snapshot, resume the simulation to its end
+    for snapshot in snapshots:
+        assert simulate.resume_simulation(str(snapshot), jobs()) == reference['metrics'].performance_ratio(reference)
+
+        resumed, engine_state = checkpoint.read_snapshot(str(snapshot))
+        resumed = simulate.run_event_simulation(jobs(), resumed, engine_state['scheduler'], engine_state['track_utilization'], None, engine_state)
+        assert outcome(resumed) == outcome(reference)
+        assert resumed['resource_utilization'].areas() == reference['resource_utilization'].areas()
+
+
+def test_snapshots_of_another_format_are_refused(tmp_path):
+    path = tmp_path / 'snapshot.bin'
+    path.write_bytes(checkpoint.SNAPSHOT_MAGIC + (checkpoint.SNAPSHOT_FORMAT_VERSION + 1).to_bytes(4, 'little') + b'state')
+    with pytest.raises(ValueError, match='snapshot format'):
+        checkpoint.read_snapshot(str(path))
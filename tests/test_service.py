@@ -0,0 +1,59 @@
+import asyncio
+import json
+import service
+
+
+async def exchange(scheduling_service, lines):
+    '''
+    To send the lines over one connection to the service and return its answers, one per line
+    '''
+    server = await asyncio.start_server(scheduling_service.handle_connection, '127.0.0.1', 0)
+    scheduler = asyncio.create_task(scheduling_service.run_scheduler())
+    reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+
+    writer.write(''.join(line + '\n' for line in lines).encode())
+    await writer.drain()
+    answers = [json.loads(await asyncio.wait_for(reader.readline(), 10)) for _ in lines]
+
+    writer.close()
+    scheduler.cancel()
+    server.close()
+    return answers
+
+
+def test_invalid_jobs_are_rejected_without_closing_the_connection(make_architecture, network):
+    eu = next(iter(network[2]))
+    job = {'id': 'job_1', 'category': 'tc', 'instructions': 5000, 'deadline': 60000, 'eu': eu}
+    lines = [json.dumps([1]),
+             json.dumps(dict(job, instructions='abc')),
+             json.dumps(dict(job, deadline=-1)),
+             json.dumps(dict(job, eu=['eu_1'])),
+             json.dumps(dict(job, id=7)),
+             'not json',
+             json.dumps(job)]
+
+    answers = asyncio.run(exchange(service.SchedulingService(make_architecture()), lines))
+
+    assert [answer['decision'] for answer in answers[:-1]] == ['rejected'] * 6
+    assert answers[-1]['id'] == 'job_1' and answers[-1]['decision'] in ('scheduled', 'dropped')
+
+
+def test_answered_jobs_are_forgotten_once_they_ended(make_architecture, jobs):
+    scheduling_service = service.SchedulingService(make_architecture())
+    architecture = scheduling_service.architecture
+    now = 0
+    scheduling_service.clock = lambda: now
+
+    for job in jobs()[:200]:
+        scheduling_service.job_queue.append(dict(job, arrival_time=0, deadline=job['deadline'] - job['arrival_time']))
+    scheduling_service.schedule_batch([])
+    resource_logs = architecture['resource_logs']
+    served_jobs = len(resource_logs.job_ids)
+
+    # Only the jobs scheduled by the retry at the new clock are still running
+    now = architecture['end_at'] + service.TRIM_INTERVAL
+    scheduling_service.schedule_batch([])
+    remaining = [entry for timeline in resource_logs.values() for entry in timeline]
+    assert all(entry['end_time'] > now for entry in remaining)
+    assert sorted(resource_logs.job_ids) == sorted(entry['job_id'] for entry in remaining)
+    assert len(resource_logs.job_ids) < served_jobs
@@ -0,0 +1,33 @@
+import pytest
+import cli
+import sharding
+import simulate
+import sofnet
+
+
+@pytest.mark.parametrize('strategy', ['fdc', 'cdc'])
+def test_sharded_baselines_schedule_like_a_single_run(make_architecture, jobs, outcome, strategy):
+    _, run = simulate.STRATEGIES[strategy]
+    reference = make_architecture(strategy)
+    reference_ratio = run(jobs(), reference)
+
+    architecture = make_architecture(strategy)
+    assert run(jobs(), architecture, shards=4) == reference_ratio
+    assert outcome(architecture) == outcome(reference)
+
+
+def test_sofnet_is_not_sharded(make_architecture, jobs):
+    with pytest.raises(ValueError, match='sharded'):
+        sharding.run_sharded_event_simulation(jobs(), make_architecture(), sofnet.algorithm, 4)
+    with pytest.raises(SystemExit):
+        cli.main(['simulate', '--strategy', 'sofnet', '--shards', '4'])
+
+
+@pytest.mark.parametrize('strategy, link', [('fdc', 'fn'), ('cdc', 'cn')])
+def test_regions_share_no_resource_on_the_sharded_link(make_architecture, strategy, link):
+    architecture = make_architecture(strategy)
+    shards = [sharding.describe_shard(architecture, eu_rows, (link,))['resource_ids']
+              for eu_rows in sharding.partition_regions(architecture, 4, (link,))]
+
+    assert len(shards) > 1
+    assert sum(len(resource_ids) for resource_ids in shards) == len(set().union(*shards))
@@ -0,0 +1,76 @@
+import random
+import pytest
+import timelines
+
+# Random timelines compared with a brute-force search of their gaps
+RANDOM_TIMELINES = 300
+HORIZON = 3000
+
+
+def find_earliest_start(busy, arrival_time, duration, discarded_until=0):
+    '''
+    To return the earliest start from arrival_time on of [start, start + duration) overlapping no busy interval, by brute force
+    '''
+    start = max(arrival_time, discarded_until)
+    is_moved = True
+    while is_moved:
+        is_moved = False
+        for busy_start, busy_end in busy:
+            if start < busy_end and busy_start < start + duration:
+                start, is_moved = busy_end, True
+    return start
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_gap_search_matches_brute_force(seed):
+    rng = random.Random(seed)
+
+    # For each random timeline, schedule jobs in their earliest gap and sometimes forget its history
+    for _ in range(RANDOM_TIMELINES // 3):
+        resource_logs = timelines.ResourceLogs(['fdc_1'])
+        timeline = resource_logs['fdc_1']
+        busy, discarded_until = [], 0
+
+        for i in range(rng.randint(1, 150)):
+            if rng.random() < 0.05:
+                discarded_until = max(discarded_until, rng.randint(0, HORIZON))
+                resource_logs.discard_before(discarded_until)
+                busy = [(start, end) for start, end in busy if end > discarded_until]
+                continue
+
+            arrival_time, duration = rng.randint(0, HORIZON), rng.randint(1, 80)
+            start_time = timeline.find_earliest_start(arrival_time, duration)
+            assert start_time == find_earliest_start(busy, arrival_time, duration, discarded_until)
+
+            if rng.random() < 0.8:
+                timeline.add_job(f'job_{i}', start_time, start_time + duration)
+                busy.append((start_time, start_time + duration))
+
+        assert sorted((entry['start_time'], entry['end_time']) for entry in timeline) == sorted(busy)
+        assert sorted(entry['job_id'] for entry in timeline) == sorted(resource_logs.job_ids)
+
+
+def test_gap_index_of_an_existing_timeline():
+    resource_logs = timelines.ResourceLogs(['cdc_1'])
+    timeline = resource_logs['cdc_1']
+    for job_id, start_time, end_time in (('job_1', 10, 20), ('job_2', 20, 30), ('job_3', 45, 50)):
+        timeline.add_job(job_id, start_time, end_time)
+
+    assert timeline.find_earliest_start(0, 10) == 0
+    assert timeline.find_earliest_start(0, 11) == 30
+    assert timeline.find_earliest_start(12, 15) == 30
+    assert timeline.find_earliest_start(12, 16) == 50
+    assert timeline.find_earliest_start(47, 1) == 50
+
+
+def test_gap_index_refuses_empty_durations_and_overlaps():
+    gaps = timelines.GapTree([(10, 20)])
+    with pytest.raises(ValueError):
+        gaps.find_earliest_start(0, 0)
+    with pytest.raises(ValueError):
+        gaps.reserve(5, 15)
+
+    # An empty interval occupies no time
+    gaps.reserve(15, 15)
+    assert gaps.find_earliest_start(0, 10) == 0
+    assert gaps.find_earliest_start(0, 11) == 20
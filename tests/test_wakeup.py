@@ -0,0 +1,19 @@
+import pytest
+import simulate
+import sofnet
+
+
+@pytest.mark.parametrize('network', ['bursty', 'batch'], indirect=True)
+@pytest.mark.parametrize('z_score_threshold', [0.0, 0.5, 1.0])
+@pytest.mark.parametrize('batched_queue_size', [1, 10 ** 9])
+def test_wakeup_index_schedules_like_the_job_list(make_architecture, jobs, outcome, monkeypatch, z_score_threshold, batched_queue_size):
+    '''
+    Deferred jobs woken by the index are decided as when the whole queue is evaluated every pass, with or without constraint batches
+    '''
+    reference = make_architecture(z_score_threshold=z_score_threshold, wakeup_index=None)
+    reference_ratio = simulate.run_simulation(jobs(), reference)
+
+    monkeypatch.setattr(sofnet, 'BATCHED_QUEUE_SIZE', batched_queue_size)
+    architecture = make_architecture(z_score_threshold=z_score_threshold)
+    assert simulate.run_simulation(jobs(), architecture) == reference_ratio
+    assert outcome(architecture) == outcome(reference)
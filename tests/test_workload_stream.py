@@ -0,0 +1,30 @@
+import pytest
+import simulate
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 10 ** 6])
+def test_workload_chunks_are_released_like_the_sorted_workload(network, tmp_path, chunksize):
+    '''
+    Reading the csv in chunks releases the jobs in the same order as the workload sorted by arrival time and deadline
+    '''
+    path = tmp_path / 'workload.csv'
+    network[3].to_csv(path, index=False)
+
+    streamed = [job['id'] for job in simulate.read_workload(str(path), chunksize)]
+    assert streamed == network[3]['id'].tolist()
+
+
+@pytest.mark.parametrize('chunksize', [1, 10 ** 6])
+def test_workload_chunks_schedule_like_the_job_list(network, make_architecture, jobs, outcome, tmp_path, chunksize):
+    '''
+    Streaming the csv in chunks into the event engine schedules the jobs as when they are all handed to it at once
+    '''
+    path = tmp_path / 'workload.csv'
+    network[3].to_csv(path, index=False)
+
+    reference = make_architecture()
+    reference_ratio = simulate.run_simulation(jobs(), reference)
+
+    architecture = make_architecture()
+    assert simulate.run_simulation(simulate.read_workload(str(path), chunksize), architecture) == reference_ratio
+    assert outcome(architecture) == outcome(reference)
@@ -0,0 +1,346 @@
+import numpy as np
+
+# Number of jobs a new timeline has room for before its arrays grow
+INITIAL_TIMELINE_CAPACITY = 8
+
+# End of the idle gap after the last job of a resource
+OPEN_END = 2 ** 62
+
+
+class Gap:
+    '''
+    Idle gap [start, end) of a resource, as a node of a GapTree
+    '''
+    __slots__ = ('start', 'end', 'priority', 'left', 'right', 'max_length')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        # Mixing the start gives a fixed pseudo-random heap priority, so the tree does not depend on a random state
+        self.priority = (start * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        self.left = None
+        self.right = None
+        self.max_length = end - start
+
+
+def update_gap(gap):
+    gap.max_length = gap.end - gap.start
+    for child in (gap.left, gap.right):
+        if child is not None and child.max_length > gap.max_length:
+            gap.max_length = child.max_length
+
+
+def rotate_right(gap):
+    left = gap.left
+    gap.left, left.right = left.right, gap
+    update_gap(gap)
+    update_gap(left)
+    return left
+
+
+def rotate_left(gap):
+    right = gap.right
+    gap.right, right.left = right.left, gap
+    update_gap(gap)
+    update_gap(right)
+    return right
+
+
+def insert_gap(node, gap):
+    if node is None:
+        return gap
+    if gap.start < node.start:
+        node.left = insert_gap(node.left, gap)
+        if node.left.priority > node.priority:
+            return rotate_right(node)
+    else:
+        node.right = insert_gap(node.right, gap)
+        if node.right.priority > node.priority:
+            return rotate_left(node)
+    update_gap(node)
+    return node
+
+
+def merge_gaps(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = merge_gaps(left.right, right)
+        update_gap(left)
+        return left
+    right.left = merge_gaps(left, right.left)
+    update_gap(right)
+    return right
+
+
+def delete_gap(node, start):
+    if node.start == start:
+        return merge_gaps(node.left, node.right)
+    if start < node.start:
+        node.left = delete_gap(node.left, start)
+    else:
+        node.right = delete_gap(node.right, start)
+    update_gap(node)
+    return node
+
+
+def refresh_gap(node, start):
+    '''
+    To update the longest gap of the subtrees on the path to the gap starting at start, once its bounds changed
+    '''
+    if start < node.start:
+        refresh_gap(node.left, start)
+    elif start > node.start:
+        refresh_gap(node.right, start)
+    update_gap(node)
+
+
+def find_first_fit(node, after, length):
+    '''
+    To return the gap with the earliest start after the given time that is at least length long, or None
+    '''
+    if node is None or node.max_length < length:
+        return None
+    if node.start <= after:
+        return find_first_fit(node.right, after, length)
+    gap = find_first_fit(node.left, after, length)
+    if gap is not None:
+        return gap
+    if node.end - node.start >= length:
+        return node
+    return find_first_fit(node.right, after, length)
+
+
+class GapTree:
+    '''
+    Idle gaps of a resource in a treap ordered by start, each subtree knowing its longest gap
+
+    Finding the earliest gap a job fits in, and reserving part of a gap, take O(log n) expected time
+    for n gaps. A new resource has a single gap, from 0 on.
+    '''
+    __slots__ = ('root',)
+
+    def __init__(self, intervals=(), start=0):
+        '''
+        To index the gaps from start on around the given (start, end) busy intervals, which must not overlap
+        '''
+        self.root = None
+        for busy_start, busy_end in sorted(intervals):
+            if busy_start > start:
+                self.root = insert_gap(self.root, Gap(start, busy_start))
+            start = max(start, busy_end)
+        self.root = insert_gap(self.root, Gap(start, OPEN_END))
+
+    def find_first(self):
+        gap = self.root
+        while gap is not None and gap.left is not None:
+            gap = gap.left
+        return gap
+
+    def find_containing(self, time):
+        '''
+        To return the gap with the latest start at or before the given time, or None
+        '''
+        node, gap = self.root, None
+        while node is not None:
+            if node.start <= time:
+                gap, node = node, node.right
+            else:
+                node = node.left
+        return gap
+
+    def find_earliest_start(self, arrival_time, length):
+        '''
+        To return the earliest time from arrival_time on at which the resource is idle for length
+
+        A job occupies its resource for at least 1 ms, so an empty length has no start and is refused.
+        '''
+        if length <= 0:
+            raise ValueError(f'a job occupies its resource for a positive time, not {length} ms')
+        gap = self.find_containing(arrival_time)
+        if gap is not None and arrival_time + length <= gap.end:
+            return arrival_time
+        return find_first_fit(self.root, arrival_time, length).start
+
+    def reserve(self, start, end):
+        '''
+        To mark [start, end) as busy, splitting the idle gap it lies in
+
+        An empty interval occupies no time, so it leaves the gaps as they are.
+        '''
+        if end <= start:
+            return
+        gap = self.find_containing(start)
+        if gap is None or end > gap.end:
+            raise ValueError(f'[{start}, {end}) overlaps a job already on the resource')
+
+        gap_start, gap_end = gap.start, gap.end
+        if start > gap_start:
+            # Keep the idle part before the job in place, and add the part after it
+            gap.end = start
+            refresh_gap(self.root, gap_start)
+            if end < gap_end:
+                self.root = insert_gap(self.root, Gap(end, gap_end))
+        elif end < gap_end:
+            # The gap now starts after the job; its order among the gaps does not change
+            gap.start = end
+            refresh_gap(self.root, end)
+        else:
+            self.root = delete_gap(self.root, gap_start)
+
+    def discard_before(self, time):
+        '''
+        To forget the idle time before the given time, so that no job can start in it
+        '''
+        while (gap := self.find_first()) is not None and gap.end <= time:
+            self.root = delete_gap(self.root, gap.start)
+
+        # The first gap keeps its place among the gaps when it starts later
+        if gap is not None and gap.start < time:
+            gap.start = time
+            refresh_gap(self.root, time)
+
+
+class Timeline:
+    '''
+    Append-only log of the jobs run on one resource, kept in growable int64 arrays
+
+    Iterating over a timeline (or indexing it) still gives {'job_id', 'start_time', 'end_time'} dicts.
+    The idle gaps between the jobs are indexed in a GapTree the first time they are searched, and
+    kept up to date from then on. A long-running owner can forget the jobs that ended by some time,
+    along with the idle time before it.
+    '''
+    __slots__ = ('logs', 'start_times', 'end_times', 'job_indices', 'size', 'available_from', 'gaps', 'discarded_until')
+
+    def __init__(self, logs, capacity=INITIAL_TIMELINE_CAPACITY):
+        self.logs = logs
+        self.start_times = np.empty(capacity, dtype=np.int64)
+        self.end_times = np.empty(capacity, dtype=np.int64)
+        self.job_indices = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+        # Latest end time of its jobs, i.e. when the resource becomes available again for good
+        self.available_from = 0
+        self.gaps = None
+        self.discarded_until = 0
+
+    def grow(self):
+        capacity = 2 * len(self.start_times)
+        for name in ('start_times', 'end_times', 'job_indices'):
+            array = np.empty(capacity, dtype=np.int64)
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+
+    def add_job(self, job_id, start_time, end_time):
+        if self.size == len(self.start_times):
+            self.grow()
+        self.start_times[self.size] = start_time
+        self.end_times[self.size] = end_time
+        self.job_indices[self.size] = self.logs.register_job(job_id)
+        self.size += 1
+        self.available_from = max(self.available_from, end_time)
+        if self.gaps is not None:
+            self.gaps.reserve(start_time, end_time)
+
+    def find_earliest_start(self, arrival_time, duration):
+        '''
+        To return the earliest start from arrival_time on of a job occupying the resource for duration, in an idle gap if one fits
+        '''
+        if self.gaps is None:
+            self.gaps = GapTree(zip(self.start_times[:self.size].tolist(), self.end_times[:self.size].tolist()), self.discarded_until)
+        return self.gaps.find_earliest_start(arrival_time, duration)
+
+    def discard_before(self, time):
+        '''
+        To forget the jobs that ended by the given time, and the idle time before it
+        '''
+        is_kept = self.end_times[:self.size] > time
+        size = int(is_kept.sum())
+        for name in ('start_times', 'end_times', 'job_indices'):
+            array = getattr(self, name)
+            array[:size] = array[:self.size][is_kept]
+        self.size = size
+
+        self.discarded_until = max(self.discarded_until, time)
+        if self.gaps is not None:
+            self.gaps.discard_before(time)
+
+    def append(self, entry):
+        self.add_job(entry['job_id'], entry['start_time'], entry['end_time'])
+
+    def execution_time(self):
+        '''
+        To return the time spent by the resource on its jobs
+        '''
+        return int((self.end_times[:self.size] - self.start_times[:self.size]).sum())
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError('timeline index out of range')
+        return {'job_id': self.logs.job_ids[self.job_indices[i]],
+                'start_time': int(self.start_times[i]),
+                'end_time': int(self.end_times[i])}
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+
+class ResourceLogs(dict):
+    '''
+    Timelines of all resources by resource id, sharing one registry of job ids
+    '''
+
+    def __init__(self, resource_ids=()):
+        super().__init__()
+        self.job_ids = []
+        self.job_index = {}
+        for resource_id in resource_ids:
+            self[resource_id] = Timeline(self)
+
+    def register_job(self, job_id):
+        if job_id not in self.job_index:
+            self.job_index[job_id] = len(self.job_ids)
+            self.job_ids.append(job_id)
+        return self.job_index[job_id]
+
+    def discard_before(self, time):
+        '''
+        To forget the jobs that ended by the given time on every resource, along with their ids
+        '''
+        for timeline in self.values():
+            timeline.discard_before(time)
+
+        # Keep the ids of the remaining jobs only, numbered in the same order
+        empty = [np.empty(0, dtype=np.int64)]
+        job_indices = np.unique(np.concatenate([timeline.job_indices[:timeline.size] for timeline in self.values()] + empty))
+        self.job_ids = [self.job_ids[i] for i in job_indices.tolist()]
+        self.job_index = {job_id: i for i, job_id in enumerate(self.job_ids)}
+        for timeline in self.values():
+            timeline.job_indices[:timeline.size] = np.searchsorted(job_indices, timeline.job_indices[:timeline.size])
+
+    def execution_cost(self):
+        '''
+        To return the aggregated execution time of all jobs on all resources
+        '''
+        return sum(timeline.execution_time() for timeline in self.values())
+
+    def export(self):
+        '''
+        To export every scheduled job as flat arrays of resource id, job id, start time and end time
+        '''
+        timelines = list(self.values())
+        empty = [np.empty(0, dtype=np.int64)]
+        job_indices = np.concatenate([timeline.job_indices[:timeline.size] for timeline in timelines] + empty)
+
+        return {'resource_id': np.repeat(np.array(list(self.keys()), dtype=str), [len(timeline) for timeline in timelines]),
+                'job_id': np.array(self.job_ids, dtype=str)[job_indices],
+                'start_time': np.concatenate([timeline.start_times[:timeline.size] for timeline in timelines] + empty),
+                'end_time': np.concatenate([timeline.end_times[:timeline.size] for timeline in timelines] + empty)}
@@ -1,5 +1,17 @@
 import math
-import matplotlib.pyplot as plt
+import numpy as np
+import logs
+from resources import ResourceTable
+
+network_log = logs.get_logger('network')
+metrics_log = logs.get_logger('metrics')
+
+# Rows of sources handled at once by the vectorized neighborhood search
+NEIGHBORHOOD_BATCH_SIZE = 1024
+
+# Links between an end-user and the resources of its jobs, as columns of the propagation delay table
+LINKS = ('fn', 'fp', 'cn', 'cp')
+LINK_INDEX = {link: i for i, link in enumerate(LINKS)}
 
 
 def fetch_native_fog_for_job(EU, job):
@@ -22,6 +34,14 @@ def fetch_public_cloud_for_job(F, EU, job):
     return F[fdc_id]['public_cdc_id']
 
 
+def fetch_resource(architecture, resource_id):
+    '''
+    To return the fdc or cdc registered under the given id
+    '''
+    F = architecture['F']
+    return F[resource_id] if resource_id in F else architecture['C'][resource_id]
+
+
 def calculate_distance(node_1, node_2):
     '''
     To find the Euclidean distance (in km) between two geographically separated nodes
@@ -42,28 +62,117 @@ def evaluate_neighborhood(source, targets):
     return neighborhood
 
 
-def map_fog_to_cloud(F, C):
+def fetch_coordinates(nodes):
+    '''
+    To collect the (x, y) coordinates of the nodes in their registration order
+    '''
+    if isinstance(nodes, ResourceTable):
+        return np.column_stack([nodes.column('x_coordinate'), nodes.column('y_coordinate')]).astype(np.int64)
+    return np.array([(node['x_coordinate'], node['y_coordinate']) for node in nodes.values()], dtype=np.int64).reshape(-1, 2)
+
+
+def calculate_distances(sources, targets):
+    '''
+    To find the Euclidean distances (in km) from each source to each target, rounded up as in calculate_distance
+    '''
+    dx = sources[:, 0, None] - targets[None, :, 0]
+    dy = sources[:, 1, None] - targets[None, :, 1]
+    return np.ceil(np.sqrt((dx * dx + dy * dy).astype(np.float64))).astype(np.int64)
+
+
+def select_two_nearest(distances, target_indices=None):
+    '''
+    To return the positions of the two nearest targets in each row, ties going to the earlier target as with a stable sort
+    '''
+    n_targets = distances.shape[1]
+    if target_indices is None:
+        target_indices = np.arange(n_targets)
+
+    # A unique key per target keeps the selection identical to sorting by distance
+    keys = distances * (int(target_indices.max()) + 1) + target_indices
+    nearest = np.argpartition(keys, 1, axis=1)[:, :2] if n_targets > 2 else np.tile(np.arange(n_targets), (len(keys), 1))
+    nearest_keys = np.take_along_axis(keys, nearest, axis=1)
+    return np.take_along_axis(nearest, np.argsort(nearest_keys, axis=1), axis=1)
+
+
+def evaluate_nearest_targets(sources, targets):
+    '''
+    To find the two nearest targets (native and public) of every source with bulk distance computations
+    '''
+    nearest = np.empty((len(sources), 2), dtype=np.int64)
+    for start in range(0, len(sources), NEIGHBORHOOD_BATCH_SIZE):
+        stop = start + NEIGHBORHOOD_BATCH_SIZE
+        nearest[start:stop] = select_two_nearest(calculate_distances(sources[start:stop], targets))
+    return nearest
+
+
+def evaluate_nearest_targets_with_kdtree(sources, targets):
+    '''
+    To find the two nearest targets of every source through a KD-tree, for very large topologies
+
+    The KD-tree proposes every target within the (rounded up) distance of the second nearest one,
+    and these candidates are ranked again with the exact distances of calculate_distance.
+    '''
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(targets)
+    float_distances, _ = tree.query(sources, k=2)
+    radii = np.ceil(float_distances[:, 1]) + 1
+    candidates = tree.query_ball_point(sources, radii)
+
+    nearest = np.empty((len(sources), 2), dtype=np.int64)
+    for i, candidate_indices in enumerate(candidates):
+        candidate_indices = np.asarray(candidate_indices, dtype=np.int64)
+        distances = calculate_distances(sources[i:i+1], targets[candidate_indices])
+        nearest[i] = candidate_indices[select_two_nearest(distances, candidate_indices)[0]]
+    return nearest
+
+
+def evaluate_neighborhoods(sources, targets, mode='numpy'):
+    '''
+    To return the ids of the native and public target of each source
+    '''
+    target_ids = list(targets.keys())
+
+    if mode == 'python':
+        pairs = []
+        for id, source in sources.items():
+            neighborhood = evaluate_neighborhood(source, targets)
+            pairs.append((neighborhood[0][1], neighborhood[1][1]))
+        return pairs
+
+    if mode == 'numpy':
+        nearest = evaluate_nearest_targets(fetch_coordinates(sources), fetch_coordinates(targets))
+    elif mode == 'kdtree':
+        nearest = evaluate_nearest_targets_with_kdtree(fetch_coordinates(sources), fetch_coordinates(targets))
+    else:
+        raise ValueError(f'Unknown neighborhood mode: {mode}')
+
+    return [(target_ids[native], target_ids[public]) for native, public in nearest]
+
+
+def map_fog_to_cloud(F, C, mode='numpy'):
     '''
     To map each fdc with its native and public cdc
     '''
     # Evaluate the neighborhood of each fdc
-    for id, fdc in F.items():
-        neighborhood = evaluate_neighborhood(fdc, C)
-        F[id]['native_cdc_id'] = neighborhood[0][1]
-        F[id]['public_cdc_id'] = neighborhood[1][1]
+    neighborhoods = evaluate_neighborhoods(F, C, mode)
+    for id, (native_cdc_id, public_cdc_id) in zip(F.keys(), neighborhoods):
+        F[id]['native_cdc_id'] = native_cdc_id
+        F[id]['public_cdc_id'] = public_cdc_id
             
     return F
 
 
-def map_end_user_to_fog(EU, F):
+def map_end_user_to_fog(EU, F, mode='numpy'):
     '''
     To map each end-user with its native and public fdc
     '''
     # Evaluate the neighborhood of each end-user
-    for id, eu in EU.items():
-        neighborhood = evaluate_neighborhood(eu, F)
-        EU[id]['native_fdc_id'] = neighborhood[0][1]
-        EU[id]['public_fdc_id'] = neighborhood[1][1]
+    neighborhoods = evaluate_neighborhoods(EU, F, mode)
+    for id, (native_fdc_id, public_fdc_id) in zip(EU.keys(), neighborhoods):
+        EU[id]['native_fdc_id'] = native_fdc_id
+        EU[id]['public_fdc_id'] = public_fdc_id
             
     return EU
 
@@ -100,6 +209,47 @@ def calculate_z_score_quantities(jobs):
 #     return (job['deadline'] - quantities['d_min']) / (quantities['d_max']- quantities['d_min'])
 
 
+def calculate_propagation_delays(nodes_1, nodes_2):
+    '''
+    To calculate the propagation delays (in ms) between the matching rows of two coordinate arrays, as in calculate_propagation_delay
+    '''
+    dx = nodes_1[:, 0] - nodes_2[:, 0]
+    dy = nodes_1[:, 1] - nodes_2[:, 1]
+    distance = 1000 * np.ceil(np.sqrt((dx * dx + dy * dy).astype(np.float64))).astype(np.int64)
+    velocity = 2 * 10**8
+    return np.ceil(1000 * distance / velocity).astype(np.int64)
+
+
+def build_link_table(EU, F, C):
+    '''
+    To find, for each end-user, the position of its native/public fdc in F and of its native/public cdc in C
+    '''
+    fdc_index = {id: i for i, id in enumerate(F.keys())}
+    cdc_index = {id: i for i, id in enumerate(C.keys())}
+
+    links = [(fdc_index[eu['native_fdc_id']],
+              fdc_index[eu['public_fdc_id']],
+              cdc_index[F[eu['native_fdc_id']]['native_cdc_id']],
+              cdc_index[F[eu['native_fdc_id']]['public_cdc_id']]) for eu in EU.values()]
+    return np.array(links, dtype=np.int64).reshape(-1, len(LINKS))
+
+
+def build_propagation_delay_table(EU, F, C, eu_links=None):
+    '''
+    To compute once the propagation delay from each end-user to its native/public fdc and native/public cdc
+    '''
+    if eu_links is None:
+        eu_links = build_link_table(EU, F, C)
+    eu_coordinates, fdc_coordinates, cdc_coordinates = fetch_coordinates(EU), fetch_coordinates(F), fetch_coordinates(C)
+
+    eu_index = {id: i for i, id in enumerate(EU.keys())}
+    propagation_delays = np.column_stack([calculate_propagation_delays(eu_coordinates, fdc_coordinates[eu_links[:, 0]]),
+                                          calculate_propagation_delays(eu_coordinates, fdc_coordinates[eu_links[:, 1]]),
+                                          calculate_propagation_delays(eu_coordinates, cdc_coordinates[eu_links[:, 2]]),
+                                          calculate_propagation_delays(eu_coordinates, cdc_coordinates[eu_links[:, 3]])])
+    return eu_index, propagation_delays
+
+
 def fetch_communication_delay(job, resource, node_1, node_2):
     transmission_delay = calculate_transmission_delay(job, resource)
     propagation_delay = calculate_propagation_delay(node_1, node_2)
@@ -133,7 +283,7 @@ def calculate_propagation_delay(node_1, node_2):
     
     distance = 1000*calculate_distance(node_1, node_2) # distance in  km
     velocity = 2 * 10**8
-    print("dist", math.ceil(1000 * distance / velocity))
+    network_log.debug('dist %s', math.ceil(1000 * distance / velocity))
     return math.ceil(1000 * distance / velocity) # converting to ms
 
 
@@ -145,15 +295,16 @@ def calculate_execution_time():
  #   return True if job['arrival_time'] + calculate_execution_time() + calculate_communication_delay(job, link) <= job['deadline'] else False
 
 
-def calculate_success_ratio(all_jobs, executed_jobs):
-    total, N_dash = 0, 0
+def calculate_success_ratio(executed_jobs, dropped_jobs=()):
+    # Dropped jobs missed their deadline
+    total, N_dash = len(dropped_jobs), 0
 
     for job_id, job_info in executed_jobs.items():
         total += 1
-        if job_info['end_time'] <= all_jobs[job_id]['deadline']:
+        if job_info['end_time'] <= job_info['deadline']:
             N_dash += 1
 
-    print(f'{N_dash} / {total}')
+    metrics_log.info('%s / %s', N_dash, total)
     return N_dash / total
 
 
@@ -168,6 +319,10 @@ def calculate_execution_cost(resource_logs):
     '''
     To calculate the aggregated execution cost of all jobs
     '''
+    # Timelines aggregate their jobs at once
+    if hasattr(resource_logs, 'execution_cost'):
+        return resource_logs.execution_cost()
+
     t_exec = 0
 
     # For each resource
@@ -188,7 +343,7 @@ def calculate_system_cost(architecture):
     F = architecture['F']
     resource_logs = architecture['resource_logs']
     t_exec = calculate_execution_cost(resource_logs)
-    print('t_exec:', t_exec)
+    metrics_log.info('t_exec: %s', t_exec)
     return calculate_set_up_cost(C, F) + t_exec
 
 
@@ -206,6 +361,10 @@ def calculate_resource_utilization(architecture):
     end_time = architecture['end_at']
     resource_utilization = architecture['resource_utilization']
 
+    # Integrate the step-function utilization up to the end of the current tick
+    if hasattr(resource_utilization, 'areas'):
+        resource_utilization = resource_utilization.areas(architecture['clock'] + 1)
+
     ru_list = []
     for resource_id in resource_utilization.keys():
         ru_list.append(resource_utilization[resource_id] / end_time)
@@ -217,6 +376,9 @@ def plot(X, Y, xlabel, ylabel, title, count):
     '''
     To visualize network performance for separate thresholds values
     '''
+    # Imported here, so that runs which never plot do not load matplotlib
+    import matplotlib.pyplot as plt
+
     plt.clf()
     plt.plot(X, Y)
     plt.xlabel(xlabel)
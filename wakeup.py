@@ -0,0 +1,155 @@
+import heapq
+from collections import defaultdict
+
+
+def calculate_z_score(deadline, d_min, d_max):
+    return (deadline - d_min) / (d_max - d_min) if d_max > d_min else 0.0
+
+
+class WakeupIndex:
+    '''
+    Job queue of the event engine that hands sofnet.algorithm only the jobs whose decision may have changed
+
+    A job left in the queue ("try scheduling later") was decided from its own fixed values, the state
+    (used capacity and available slot) of its fn, fp, cn and cp, and whether its z-score was above the
+    threshold. Until one of those changes, evaluating it again would leave it in the queue again. So
+    the job sleeps, registered on its four resources and on the side of the threshold its z-score was
+    on, and is woken when one of the resources is allocated or freed, or when the deadline range of
+    the queue moves its z-score across the threshold.
+
+    Jobs are evaluated in queue order. A job woken during a pass by a job ahead of it is evaluated in
+    the same pass, one woken by a job behind it in the next pass, exactly as a full pass would see them.
+    '''
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_seq = 0
+
+        # Jobs to evaluate in this pass, and jobs woken behind the job being evaluated
+        self.awake = []
+        self.next_awake = []
+        self.position = None
+
+        # Sleeping jobs by the generation of their registrations, which are dropped lazily
+        self.sleeping = {}
+        self.generation = 0
+        self.waiting = defaultdict(list)
+        self.low_sleepers = []
+        self.high_sleepers = []
+        self.parameters = None
+
+        # Deadline range of the whole queue, which normalizes the z-scores
+        self.earliest_deadlines = []
+        self.latest_deadlines = []
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __iter__(self):
+        for seq in sorted(self.jobs):
+            yield self.jobs[seq]
+
+    def append(self, job):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.jobs[seq] = job
+        heapq.heappush(self.earliest_deadlines, (job['deadline'], seq))
+        heapq.heappush(self.latest_deadlines, (-job['deadline'], seq))
+        self.push_awake(seq)
+
+    def push_awake(self, seq):
+        if self.position is not None and seq < self.position:
+            heapq.heappush(self.next_awake, seq)
+        else:
+            heapq.heappush(self.awake, seq)
+
+    def wake(self, seq):
+        del self.sleeping[seq]
+        self.push_awake(seq)
+
+    def wake_resource(self, resource_id):
+        '''
+        To wake the jobs waiting on a resource whose capacity or available slot changed
+        '''
+        for seq, generation in self.waiting.pop(resource_id, ()):
+            if self.sleeping.get(seq) == generation:
+                self.wake(seq)
+
+    def wake_all(self):
+        for seq in list(self.sleeping):
+            self.wake(seq)
+
+    def sleep(self, seq, resource_ids, is_low_z_score):
+        self.generation += 1
+        self.sleeping[seq] = self.generation
+        for resource_id in resource_ids:
+            self.waiting[resource_id].append((seq, self.generation))
+
+        deadline = self.jobs[seq]['deadline']
+        if is_low_z_score:
+            heapq.heappush(self.low_sleepers, (-deadline, seq, self.generation))
+        else:
+            heapq.heappush(self.high_sleepers, (deadline, seq, self.generation))
+
+    def deadline_range(self):
+        for deadlines in (self.earliest_deadlines, self.latest_deadlines):
+            while deadlines[0][1] not in self.jobs:
+                heapq.heappop(deadlines)
+        return self.earliest_deadlines[0][0], -self.latest_deadlines[0][0]
+
+    def wake_crossing_threshold(self, d_min, d_max, z_score_threshold):
+        '''
+        To wake the sleeping jobs whose z-score is now on the other side of the threshold
+
+        The z-score grows with the deadline, so these are the latest deadlines of the jobs that
+        slept below the threshold and the earliest of those that slept above it.
+        '''
+        while self.low_sleepers:
+            negative_deadline, seq, generation = self.low_sleepers[0]
+            if self.sleeping.get(seq) == generation and calculate_z_score(-negative_deadline, d_min, d_max) <= z_score_threshold:
+                break
+            heapq.heappop(self.low_sleepers)
+            if self.sleeping.get(seq) == generation:
+                self.wake(seq)
+
+        while self.high_sleepers:
+            deadline, seq, generation = self.high_sleepers[0]
+            if self.sleeping.get(seq) == generation and calculate_z_score(deadline, d_min, d_max) > z_score_threshold:
+                break
+            heapq.heappop(self.high_sleepers)
+            if self.sleeping.get(seq) == generation:
+                self.wake(seq)
+
+    def start_pass(self, architecture):
+        '''
+        To wake the jobs the coming pass may decide differently, returning the deadline range of the queue
+        '''
+        parameters = (architecture['SF'], architecture['z_score_threshold'])
+        if parameters != self.parameters:
+            self.parameters = parameters
+            self.wake_all()
+
+        d_min, d_max = self.deadline_range()
+        self.wake_crossing_threshold(d_min, d_max, architecture['z_score_threshold'])
+        return d_min, d_max
+
+    def awake_jobs(self):
+        return [self.jobs[seq] for seq in sorted(self.awake)]
+
+    def next_job(self):
+        '''
+        To return the next awake job of the pass in queue order with its position, or None at the end of the pass
+        '''
+        if self.awake:
+            self.position = heapq.heappop(self.awake)
+            return self.position, self.jobs[self.position]
+
+        self.position = None
+        self.awake, self.next_awake = self.next_awake, []
+        return None
+
+    def finish_job(self, seq, has_left_queue, resource_ids, is_low_z_score):
+        if has_left_queue:
+            del self.jobs[seq]
+        else:
+            self.sleep(seq, resource_ids, is_low_z_score)